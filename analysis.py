@@ -1,17 +1,91 @@
-from collections import defaultdict, namedtuple
-import math
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
 import re
+import warnings
 
-from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.cluster.hierarchy import linkage, fcluster, leaves_list
+from scipy.cluster.vq import kmeans2
+import scipy.sparse as sparse
+import scipy.special as special
 import scipy.stats as ss
 import pandas as pd
 import numpy as np
 
-from obo_parser import GODag
+from associations import AssociationStore
+from obo_parser import CompactGODag
+from search_index import SearchIndex
 
 
 Ontology = namedtuple('Ontology', 'name, letter, id')
-Term = namedtuple('Term', 'id, p_value, proteins')
+
+SNAPSHOT_FORMAT = '1' # Sessions of another format are refused by load_snapshot
+SNAPSHOT_PARAMETERS = ('pg_path', 'database_path', 'ass_path', 'id_regex', 'samples', 'replicas',
+                       'bin_size', 'p_value', 'distance_treshold', 'linkage', 'p_value_go',
+                       'go_alternative', 'csv_engine', 'kmeans_clusters', 'n_jobs')
+
+
+def fisher_exact(a, b, c, d, alternative='two-sided'):
+    """Fisher's exact test for many 2x2 tables [[a, b], [c, d]] at once.
+
+    Gives the same p-values as scipy.stats.fisher_exact, but takes one
+    array per table cell and evaluates the hypergeometric distribution
+    for all tables together. alternative is 'two-sided', 'greater'
+    (enrichment) or 'less'.
+    """
+    a, b, c, d = (np.asarray(x, dtype=np.int64) for x in (a, b, c, d))
+    n1, n2, n = a + b, c + d, a + c
+    m = n1 + n2
+    if alternative == 'less':
+        p = ss.hypergeom.cdf(a, m, n1, n)
+    elif alternative == 'greater':
+        p = ss.hypergeom.sf(a - 1, m, n1, n)
+    elif alternative == 'two-sided':
+        p = _two_sided_p(a, m, n1, n)
+    else:
+        raise ValueError("alternative should be 'two-sided', 'less' or 'greater'")
+    # A table with an empty row or column carries no information.
+    p[(n1 == 0) | (n2 == 0) | (n == 0) | (b + d == 0)] = 1.
+    return np.minimum(p, 1.)
+
+
+def _two_sided_p(x, m, n1, n):
+    # Sum of the probabilities of all tables at most as likely as the
+    # observed one. The hypergeometric pmf is unimodal, so the tail on
+    # the other side of the mode is found by a bisection that runs for
+    # all tables in lockstep.
+    pmf = lambda k: ss.hypergeom.pmf(k, m, n1, n)
+    gamma = 1 + 1e-14
+    lo = np.maximum(0, n - (m - n1))
+    hi = np.minimum(n, n1)
+    mode = ((n + 1) * (n1 + 1) // (m + 2)).astype(np.int64)
+    p_exact = pmf(x)
+    p_mode = pmf(mode)
+    threshold = p_exact * gamma
+    lower = x < mode
+
+    # Bounds of the other tail: pmf(inner) > threshold >= pmf(outer).
+    outer = np.where(lower, hi, lo)
+    inner = mode.copy()
+    other_tail = pmf(outer) <= threshold
+    searching = other_tail & (np.abs(inner - outer) > 1)
+    while searching.any():
+        mid = (inner + outer) // 2
+        below = pmf(mid) <= threshold
+        outer = np.where(searching & below, mid, outer)
+        inner = np.where(searching & ~below, mid, inner)
+        searching &= np.abs(inner - outer) > 1
+
+    p = np.where(
+        lower,
+        ss.hypergeom.cdf(x, m, n1, n) + np.where(other_tail, ss.hypergeom.sf(outer - 1, m, n1, n), 0.),
+        ss.hypergeom.sf(x - 1, m, n1, n) + np.where(other_tail, ss.hypergeom.cdf(outer, m, n1, n), 0.))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        at_mode = np.abs(p_exact - p_mode) / np.maximum(p_exact, p_mode) <= 1e-14
+    p[at_mode] = 1.
+    return p
 
 
 class Analysis(object):
@@ -19,16 +93,35 @@ class Analysis(object):
         self.protein_groups = None
         self.id_regex = '.*'
         self.bin_size = 300
+        self.n_jobs = -1 # Threads for the per sample steps, -1 for all cores
         self.p_value = 0.05
         self.distance_treshold = 2
         self.linkage = 'average'
+        self.kmeans_clusters = 500 # Pre-clusters of the 'kmeans' linkage
         self.p_value_go = 0.05
+        self.go_alternative = 'two-sided' # or 'greater' / 'less'
         self._ontology = 'Molecular function'
         self.go_dag = None
-        self.go_terms = {}
+        self.z = None
+        self.z_labels = None # Leaf of every significant row, for 'kmeans'
+        self.z_significant = None # Key of the significant set z was computed for
+        self.go_terms = pd.DataFrame(columns=['p_value', 'proteins'])
+        self.go_term_proteins = pd.DataFrame(columns=['go_id', 'id'])
+        self.go_significant = None # Key of the significant set of go_terms
         self.pg_path = pg_path # Protein groups
+        self.csv_engine = 'c' # or 'pyarrow'
         self.database_path = None
         self.ass_path = None # Associations file
+        self.association_store = None
+        self._protein_id_maps = {} # id_regex -> (protein_map, unmatched)
+        self._data_version = 0
+        self._associations_version = 0
+        self._stages = {} # stage -> inputs it was last computed with
+        self._go_tests = {} # (significant, associations, ontology, alternative) -> test results
+        self.histogram_bins = 100
+        self.histograms = None # (edges, counts of sample x p class x bin)
+        self._search_index = None
+        self.unmatched_protein_ids = None
         if pg_path is not None:
             self.load_data(pg_path)
             
@@ -50,16 +143,38 @@ class Analysis(object):
             columns.update({'Potential contaminant': 'contaminant'})
         if 'Contaminant' in headers:
             columns.update({'Contaminant': 'contaminant'})
-        return columns
+        if 'Gene names' in headers:
+            columns['Gene names'] = 'gene_names'
+        # File order, so every csv engine yields the same column layout
+        order = {header: i for i, header in enumerate(headers)}
+        return OrderedDict(sorted(columns.items(), key=lambda item: order.get(item[0], -1)))
         
     def _map_protein_ids(self, id_regex):
-        regex = re.compile(id_regex)
-        d = {}
-        for id_, protein_ids in zip(self.protein_groups.id, self.protein_groups.protein_ids):
-            for protein_id in protein_ids.split(';'):
-                protein_id = regex.findall(protein_id)[0]
-                d[protein_id] = id_
-        return d
+        """Return a Series from protein accession to protein group id.
+
+        Accessions are the id_regex matches (its first group, if any) in
+        the ';' separated protein_ids. Accessions without a match are kept
+        in unmatched_protein_ids. Results are cached per regex until new
+        data is loaded.
+        """
+        if id_regex in self._protein_id_maps:
+            protein_map, self.unmatched_protein_ids = self._protein_id_maps[id_regex]
+            return protein_map
+        pattern = id_regex if re.compile(id_regex).groups else '({})'.format(id_regex)
+        accessions = pd.DataFrame({
+            'id': self.protein_groups.id.values,
+            'protein_id': self.protein_groups.protein_ids.str.split(';').values
+        }).explode('protein_id')
+        extracted = accessions.protein_id.str.extract(pattern, expand=False)
+        if isinstance(extracted, pd.DataFrame): # More than one group
+            extracted = extracted[0]
+        matched = extracted.notnull()
+        self.unmatched_protein_ids = accessions[~matched].reset_index(drop=True)
+        # A protein in several groups maps to the last one
+        protein_map = pd.Series(accessions.id[matched].values, index=extracted[matched].values)
+        protein_map = protein_map[~protein_map.index.duplicated(keep='last')]
+        self._protein_id_maps[id_regex] = (protein_map, self.unmatched_protein_ids)
+        return protein_map
     
     @property
     def ontology(self):
@@ -76,132 +191,423 @@ class Analysis(object):
         else:
             raise Exception('Invalid ontology name')
         
-    def load_data(self, file_path=None):
+    def load_data(self, file_path=None, engine=None):
         if file_path is None:
             file_path = self.pg_path
+        if engine is None:
+            engine = self.csv_engine
         try:
             columns = self._find_column_names(file_path)
-            self.protein_groups = pd.read_table(file_path, usecols=columns.keys())
+            text_columns = ('Reverse', 'contaminant', 'protein_ids', 'gene_names')
+            dtypes = {header: str if column in text_columns else float
+                      for header, column in columns.items() if column != 'id'}
+            protein_groups = pd.read_table(file_path, usecols=list(columns.keys()),
+                                           dtype=dtypes, engine=engine)
         except ValueError: 
             raise Exception('Data file is missing columns.')
-        self.protein_groups.rename(columns=columns, inplace=True)
+        protein_groups.rename(columns=columns, inplace=True)
+        self._protein_id_maps = {}
+        self._data_changed()
 
-        self.protein_groups = self.protein_groups[self.protein_groups.Reverse != '+']
-        self.protein_groups = self.protein_groups[self.protein_groups.contaminant != '+']
-        for column in columns.values():
-            if not column.startswith('ratio'): continue
-            self.protein_groups = self.protein_groups[pd.notnull(self.protein_groups[column])]
-            self.protein_groups['log_{}'.format(column)] = np.log2(self.protein_groups[column])
-        self.protein_groups.drop('Reverse', axis=1, inplace=True)
-        self.protein_groups.drop('contaminant', axis=1, inplace=True)
+        # One mask for reverse hits, contaminants and missing ratios
+        ratio_cols = [column for column in columns.values() if column.startswith('ratio')]
+        valid = ((protein_groups.Reverse != '+').values & (protein_groups.contaminant != '+').values
+                 & protein_groups[ratio_cols].notna().values.all(axis=1))
+
+        # The kept float columns and the log ratios are copied once, into
+        # a single block, and the other columns are inserted into its
+        # frame. The parser's arrays are dropped as they are copied.
+        keep = [column for column in columns.values() if column not in ('Reverse', 'contaminant')]
+        index = protein_groups.index[valid]
+        arrays = {column: protein_groups[column].values for column in keep}
+        del protein_groups
+        float_cols = [column for column in keep if column not in text_columns and column != 'id']
+        log_cols = ['log_{}'.format(column) for column in ratio_cols]
+        block = np.empty((len(index), len(float_cols) + len(log_cols)), order='F')
+        for i, column in enumerate(float_cols):
+            block[:, i] = arrays.pop(column)[valid]
+        ratio_positions = [float_cols.index(column) for column in ratio_cols]
+        np.log2(block[:, ratio_positions], out=block[:, len(float_cols):])
+        frame = pd.DataFrame(block, index=index, columns=float_cols + log_cols, copy=False)
+        for position, column in enumerate(keep):
+            if column in arrays:
+                frame.insert(position, column, arrays[column][valid])
+        self.protein_groups = frame
 
     def load_associations(self, file_path=None, id_regex=None):
         if file_path is None:
             file_path = self.ass_path
         if id_regex is None:
             id_regex  = self.id_regex
-        d = self._map_protein_ids(id_regex)
-        self.associations = pd.read_table(file_path, comment='!', header=None,
-            usecols=[1, 4, 8], names=['protein_id', 'go_id', 'class'])
-        self.associations.drop_duplicates(inplace=True)
-        self.associations = self.associations[self.associations.protein_id.isin(d.keys())]
-        self.associations.protein_id = self.associations.protein_id.apply(lambda x: d[x])
+        protein_map = self._map_protein_ids(id_regex)
+        store = self.association_store
+        if store is None or store.file_path != file_path:
+            self.association_store = AssociationStore(file_path)
+        self.associations = self.association_store.associations(protein_map)
+        self._index_associations()
+
+    def _index_associations(self):
+        # Inverted index from GO id to protein groups: one sparse term x
+        # protein group incidence matrix per ontology class, with columns
+        # at the row positions of protein_groups.
+        pg_index = pd.Index(self.protein_groups.id)
+        self._associations_version += 1
+        self.go_index = {}
+        for letter, associations in self.associations.groupby('class'):
+            codes, go_ids = pd.factorize(associations.go_id)
+            positions = pg_index.get_indexer(associations.protein_id)
+            incidence = sparse.csr_matrix(
+                (np.ones(len(codes), dtype=np.int32), (codes, positions)),
+                shape=(len(go_ids), len(pg_index)))
+            incidence.sum_duplicates()
+            incidence.data[:] = 1
+            self.go_index[letter] = (np.asarray(go_ids), incidence)
     
     def load_go_database(self, file_path=None):
         if file_path is None:
             file_path = self.database_path
-        self.go_dag = GODag(file_path)
+        self.go_dag = CompactGODag(file_path)
     
     def find_significant(self):
-        def p(log_ratio, limits):
-            r_min_1, r_0, r_1 = limits
-            if log_ratio > r_0:
-                z = (log_ratio - r_0) / (r_1 - r_0)
-            else:
-                z = (r_0 - log_ratio) / (r_0 - r_min_1)
-            return 0.5 * math.erfc(z / math.sqrt(2))
-    
-        def bin_p(bin, sample):
-            log_ratio = bin['log_ratio_{}'.format(sample)]
-            limits = self.limits(log_ratio)
-            bin['p_{}'.format(sample)] = log_ratio.apply(p, args=(limits,))
-            return bin
-            
-        self.bin_proteins(self.bin_size)
-        for sample in self.samples:
-            bin_column = 'bin_{}'.format(sample)
-            self.protein_groups = self.protein_groups.groupby(bin_column).apply(bin_p, sample=sample)
-            self.protein_groups.drop(bin_column, axis=1, inplace=True)
-        significant = pd.DataFrame({c: self.protein_groups[c] <= self.p_value
-                                    for c in self.protein_groups 
-                                    if c.startswith('p_')}).any(axis=1)
+        """Compute the p values and significant column.
+
+        Stages whose inputs did not change since the last call are
+        skipped: a new p value cutoff only recomputes the significant
+        column. Returns whether anything was recomputed.
+        """
+        p_cols = ['p_{}'.format(sample) for sample in self.samples]
+        p_inputs = (self._data_version, tuple(self.samples), self.bin_size)
+        significant_inputs = (p_inputs, self.p_value)
+        if self._is_current('significant', significant_inputs):
+            return False
+        if not self._is_current('p_values', p_inputs):
+            p_values = self._map_samples(self._sample_p_values, self.samples)
+            self._set_columns(p_cols, np.column_stack(p_values))
+            self._stages['p_values'] = p_inputs
+            self.sample_histograms()
+        significant = (self.protein_groups[p_cols] <= self.p_value).any(axis=1)
         self.protein_groups['significant'] = significant
+        self._stages['significant'] = significant_inputs
+        # Clusters and GO terms of another significant set are stale
+        key = self.significant_key()
+        if self.z_significant != key:
+            self._clear_clusters()
+        if self.go_significant != key:
+            self._clear_go_terms()
+        return True
+
+    def significant_key(self):
+        """sha1 of the significant column, None before find_significant."""
+        if self.protein_groups is None or 'significant' not in self.protein_groups:
+            return None
+        significant = (self.protein_groups.significant == True).values
+        return hashlib.sha1(significant.tobytes()).hexdigest()
+
+    def _clear_clusters(self):
+        self.z = None
+        self.z_labels = None
+        self.z_significant = None
+        self._stages.pop('linkage', None)
+        self._stages.pop('cluster', None)
+        if 'cluster' in self.protein_groups:
+            del self.protein_groups['cluster']
+
+    def _clear_go_terms(self):
+        self.go_terms = pd.DataFrame(columns=['p_value', 'proteins'])
+        self.go_term_proteins = pd.DataFrame(columns=['go_id', 'id'])
+        self.go_significant = None
+
+    def sample_histograms(self):
+        """Log ratio histograms of all samples, stacked by p value class.
+
+        Returns (edges, counts) with counts of shape (samples, 4, bins),
+        see p_classes for the classes. The edges span the log ratios of
+        all samples. Computed once for every set of p values.
+        """
+        inputs = (self._data_version, tuple(self.samples), self.bin_size)
+        if self.histograms is not None and self._is_current('histograms', inputs):
+            return self.histograms
+        pgs = self.protein_groups
+        log_ratios = pgs[['log_ratio_{}'.format(sample) for sample in self.samples]].values
+        p = pgs[['p_{}'.format(sample) for sample in self.samples]].values
+        finite = np.isfinite(log_ratios)
+        low, high = (log_ratios[finite].min(), log_ratios[finite].max()) if finite.any() else (0., 1.)
+        if high <= low:
+            high = low + 1.
+        edges = np.linspace(low, high, self.histogram_bins + 1)
+
+        # One bincount over (sample, class, bin) for the whole block
+        with np.errstate(invalid='ignore'):
+            bins = ((log_ratios - low) * (self.histogram_bins / (high - low)))
+        bins = np.clip(np.where(finite, bins, 0).astype(np.int64), 0, self.histogram_bins - 1)
+        sample_offsets = np.arange(len(self.samples)) * 4
+        flat = ((sample_offsets + self.p_classes(p)) * self.histogram_bins + bins)[finite]
+        counts = np.bincount(flat, minlength=len(self.samples) * 4 * self.histogram_bins)
+        self.histograms = (edges, counts.reshape(len(self.samples), 4, self.histogram_bins))
+        self._stages['histograms'] = inputs
+        return self.histograms
+
+    def search_index(self):
+        """SearchIndex over the accessions and gene names, built once per data."""
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.protein_groups)
+        return self._search_index
+
+    @staticmethod
+    def p_classes(p):
+        """0 for p > 0.05, 1 for p <= 0.05, 2 for p <= 0.01 and 3 for p < 0.001."""
+        return np.select([p < 0.001, p <= 0.01, p <= 0.05], [3, 2, 1], 0)
 
     def bin_proteins(self, bin_size):
+        bins = self._map_samples(lambda sample: self._sample_bins(sample, bin_size), self.samples)
+        bin_cols = ['bin_{}'.format(sample) for sample in self.samples]
+        self._set_columns(bin_cols, np.column_stack(bins))
+
+    def _set_columns(self, columns, values):
+        # Replaces existing columns in place and adds the new ones as a
+        # single block, rather than inserting them one by one.
+        pgs = self.protein_groups
+        values = pd.DataFrame(values, index=pgs.index, columns=columns)
+        existing = [column for column in columns if column in pgs]
+        if existing:
+            pgs[existing] = values[existing]
+        new = [column for column in columns if column not in pgs]
+        if new:
+            self.protein_groups = pd.concat([pgs, values[new]], axis=1)
+
+    def _map_samples(self, function, samples):
+        # Samples are independent and the work is in numpy, which releases
+        # the GIL, so threads are enough to use several cores.
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        if n_jobs <= 1 or len(samples) <= 1:
+            return [function(sample) for sample in samples]
+        with ThreadPoolExecutor(min(n_jobs, len(samples))) as executor:
+            return list(executor.map(function, samples))
+
+    def _sample_bins(self, sample, bin_size):
         protein_count = len(self.protein_groups.index)
-        bin_count = math.floor(protein_count / bin_size)
-
-        bins = []
-        for i in range(1, bin_count+1):
-            size = bin_size
-            if i == bin_count:
-                size = bin_size + protein_count % bin_size
-            bins.extend([i] * size)
-
-        for sample in self.samples:
-            self.protein_groups.sort_values('intensity_{}'.format(sample), inplace=True)
-            self.protein_groups['bin_{}'.format(sample)] = bins
+        bin_count = max(protein_count // bin_size, 1)
+
+        # Bin of the i-th least intense protein; the remainder goes to the last bin.
+        bins = np.minimum(np.arange(protein_count) // bin_size, bin_count - 1) + 1
+        intensity = self.protein_groups['intensity_{}'.format(sample)].values
+        sample_bins = np.empty(protein_count, dtype=int)
+        sample_bins[np.argsort(intensity, kind='stable')] = bins
+        return sample_bins
+
+    def _sample_p_values(self, sample):
+        bins = self._sample_bins(sample, self.bin_size)
+        log_ratio = self.protein_groups['log_ratio_{}'.format(sample)].values
+
+        # Mean and sample standard deviation of each intensity bin
+        counts = np.bincount(bins)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.bincount(bins, log_ratio) / counts
+            deviation = log_ratio - mean[bins]
+            std = np.sqrt(np.bincount(bins, deviation * deviation) / (counts - 1))
+        return self.p_values(log_ratio, *self.limits(mean[bins], std[bins]))
         
-    def limits(self, log_ratio):
-        mean = log_ratio.mean()
-        std = log_ratio.std()
+    def limits(self, mean, std):
+        mean = np.asarray(mean, dtype=float)
+        std = np.asarray(std, dtype=float)
         r_min_1 = ss.norm.ppf(0.1587, loc=mean, scale=std)
         r_0 = ss.norm.ppf(0.5, loc=mean, scale=std)
         r_1 = ss.norm.ppf(0.8413, loc=mean, scale=std)
         return (r_min_1, r_0, r_1)
+
+    @staticmethod
+    def p_values(log_ratio, r_min_1, r_0, r_1):
+        # Asymmetric z-score: distance to the median scaled by the
+        # spread on the side of the distribution the ratio falls on.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(log_ratio > r_0,
+                         (log_ratio - r_0) / (r_1 - r_0),
+                         (r_0 - log_ratio) / (r_0 - r_min_1))
+        return 0.5 * special.erfc(z / np.sqrt(2))
         
     def find_go_terms(self):
-        for _ in self.iterate_go_terms():
-            pass
-    
-    def iterate_go_terms(self):
+        """Test the terms of the current ontology and keep the enriched ones.
+
+        The test results are cached per significant set, associations,
+        ontology and alternative, so a new p_value_go only filters them.
+        """
         pgs = self.protein_groups # Easier to work with
-        associations = self.associations[self.associations['class'] == self.ontology.letter]
-        significant_count = len(pgs[pgs.significant == True])
+        empty = (np.array([], dtype=object), sparse.csr_matrix((0, len(pgs.index)), dtype=np.int32))
+        go_ids, incidence = self.go_index.get(self.ontology.letter, empty)
+        significant = (pgs.significant == True).values
+        key = (self._stages.get('significant'), self._associations_version,
+               self.ontology.letter, self.go_alternative)
+        if key not in self._go_tests:
+            # Results of an older significant set are not needed anymore
+            self._go_tests = {k: v for k, v in self._go_tests.items() if k[0] == key[0]}
+            self._go_tests[key] = self._test_go_terms(incidence, significant)
+        tested, significant_in_term, p = self._go_tests[key]
+        self.go_significant = self.significant_key()
 
-        self.go_terms = {}
-        for go_id in pd.unique(associations.go_id.ravel()):
-            protein_ids = set(associations[associations.go_id == go_id].protein_id)
-            proteins = pgs[pgs.id.isin(protein_ids)]
-            
-            significant = proteins[proteins.significant == True]
-            if len(significant) == 0:
-                continue
-            
-            # Calculate the 2x2 table values for the fisher's exact test
-            significant_in_term = len(significant)
-            not_significant_in_term = len(proteins) - significant_in_term
-            table = [
-                [significant_in_term, significant_count - significant_in_term],
-                [not_significant_in_term, len(pgs) - significant_in_term]
-            ]
-            
-            # Calculate the fisher's exact test's p-value
-            _, p = ss.fisher_exact(table)
-            if p <= self.p_value_go:
-                self.go_terms[go_id] = Term(go_id, p, significant)
-            yield
+        enriched = p <= self.p_value_go
+        terms = tested[enriched]
+        self.go_terms = pd.DataFrame(
+            {'p_value': p[enriched], 'proteins': significant_in_term[enriched]},
+            index=pd.Index(go_ids[terms], name='go_id'))
+
+        # Significant protein groups of the enriched terms, in long format
+        members = incidence[terms].tocoo()
+        in_term = significant[members.col]
+        self.go_term_proteins = pd.DataFrame({
+            'go_id': go_ids[terms][members.row[in_term]],
+            'id': pgs.id.values[members.col[in_term]]})
+
+    def _test_go_terms(self, incidence, significant):
+        significant_count = significant.sum()
+
+        # Term sizes and significant counts for all terms in one product
+        term_counts = incidence.getnnz(axis=1)
+        significant_counts = incidence.dot(significant.astype(np.int32))
+        tested = np.flatnonzero(significant_counts)
+
+        # 2x2 table values for the fisher's exact test of every term
+        significant_in_term = significant_counts[tested]
+        not_significant_in_term = term_counts[tested] - significant_in_term
+        p = fisher_exact(significant_in_term, significant_count - significant_in_term,
+                         not_significant_in_term, len(significant) - significant_in_term,
+                         self.go_alternative)
+        return tested, significant_in_term, p
+
+    def term_proteins(self, go_id):
+        proteins = self.go_term_proteins
+        protein_ids = proteins.id[proteins.go_id == go_id]
+        return self.protein_groups[self.protein_groups.id.isin(protein_ids)]
 
     def cluster(self):
+        """Cluster the significant protein groups; returns whether it was rerun.
+
+        The linkage is cached per significant set, ratio columns and
+        method, so a new distance_treshold only cuts the cached tree.
+        """
+        pgs = self.protein_groups
         ratio_cols = ['log_ratio_{}'.format(sample) for sample in self.samples]
         ratio_cols.extend(['log_ratio_{}'.format(replica) for replica in self.replicas])
-        significant = self.protein_groups[self.protein_groups.significant == True]
-        data = significant[ratio_cols]
-        self.z = linkage(data, method=self.linkage)
+        significant = (pgs.significant == True).values
+        significant_key = self.significant_key()
+        linkage_inputs = (self._data_version, significant_key, tuple(ratio_cols), self.linkage)
+        inputs = (linkage_inputs, self.distance_treshold)
+        if self._is_current('cluster', inputs):
+            return False
+        if not self._is_current('linkage', linkage_inputs):
+            data = pgs.loc[significant, ratio_cols].values
+            self.z_labels = None
+            if self.linkage == 'kmeans':
+                self.z, self.z_labels = self._kmeans_linkage(data)
+            else:
+                self.z = linkage(data, method=self.linkage)
+            self._stages['linkage'] = linkage_inputs
+            self.z_significant = significant_key
         clusters = fcluster(self.z, self.distance_treshold, 'distance')
-        self.protein_groups.ix[self.protein_groups.significant == True, 'cluster'] = clusters
+        if self.z_labels is not None:
+            clusters = clusters[self.z_labels]
+        pgs.loc[significant, 'cluster'] = clusters
+        self._stages['cluster'] = inputs
+        return True
+
+    def _kmeans_linkage(self, data):
+        # Two stages for large sets: k-means pre-clusters, then average
+        # linkage on their centroids. Memory is O(n * k) instead of O(n^2).
+        k = min(self.kmeans_clusters, len(data))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning) # Empty clusters are dropped below
+            centroids, labels = kmeans2(data, k, minit='points', seed=0)
+        used, labels = np.unique(labels, return_inverse=True)
+        return linkage(centroids[used], method='average'), labels
+
+    def leaf_rows(self, data):
+        """Rows of data, the significant rows, in dendrogram leaf order.
+
+        With the 'kmeans' linkage the leaves are the centroids, so this
+        is the mean row of every leaf's members, one row per leaf.
+        """
+        leaves = leaves_list(self.z)
+        if self.z_labels is None:
+            return data[leaves]
+        counts = np.bincount(self.z_labels, minlength=len(leaves))
+        sums = np.zeros((len(leaves), data.shape[1]))
+        np.add.at(sums, self.z_labels, data)
+        return (sums / counts[:, np.newaxis])[leaves]
+
+    def save_snapshot(self, path):
+        """Save the results and parameters to the directory path.
+
+        The tables are written as Parquet files, the linkage matrix (and
+        the k-means labels of its leaves) as .npy files and the
+        parameters to manifest.json, with the keys of the significant
+        sets the linkage and GO terms were computed for.
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.protein_groups.to_parquet(os.path.join(path, 'protein_groups.parquet'))
+        self.go_terms.to_parquet(os.path.join(path, 'go_terms.parquet'))
+        self.go_term_proteins.to_parquet(os.path.join(path, 'go_term_proteins.parquet'))
+        for name in ('z', 'z_labels'):
+            array_path = os.path.join(path, '{}.npy'.format(name))
+            if getattr(self, name) is not None:
+                np.save(array_path, getattr(self, name))
+            elif os.path.exists(array_path):
+                os.remove(array_path)
+        parameters = {name: getattr(self, name) for name in SNAPSHOT_PARAMETERS}
+        parameters['ontology'] = getattr(self.ontology, 'name', self.ontology)
+        with open(os.path.join(path, 'manifest.json'), 'w') as manifest:
+            json.dump({'format': SNAPSHOT_FORMAT, 'parameters': parameters,
+                       'z_significant': self.z_significant,
+                       'go_significant': self.go_significant}, manifest, indent=2)
+
+    def load_snapshot(self, path):
+        """Restore the results and parameters saved by save_snapshot.
+
+        The linkage and GO terms are only restored if they were computed
+        for the saved significant column.
+        """
+        try:
+            with open(os.path.join(path, 'manifest.json')) as manifest:
+                manifest = json.load(manifest)
+        except (IOError, OSError, ValueError):
+            raise Exception('Not a saved session.')
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise Exception('Saved session has an unsupported format.')
+        parameters = manifest['parameters']
+        for name in SNAPSHOT_PARAMETERS:
+            if name in parameters:
+                setattr(self, name, parameters[name])
+        self.ontology = parameters['ontology']
+        self.protein_groups = pd.read_parquet(os.path.join(path, 'protein_groups.parquet'))
+        self.go_terms = pd.read_parquet(os.path.join(path, 'go_terms.parquet'))
+        self.go_term_proteins = pd.read_parquet(os.path.join(path, 'go_term_proteins.parquet'))
+        for name in ('z', 'z_labels'):
+            array_path = os.path.join(path, '{}.npy'.format(name))
+            setattr(self, name, np.load(array_path) if os.path.exists(array_path) else None)
+        self.z_significant = manifest.get('z_significant')
+        self.go_significant = manifest.get('go_significant')
+        key = self.significant_key()
+        if key is None or self.z_significant != key:
+            self._clear_clusters()
+        if key is None or self.go_significant != key:
+            self._clear_go_terms()
+        self.go_dag = None
+        self.association_store = None
+        self._protein_id_maps = {}
+        self._data_changed()
 
     def swap_replicas(self):
         cols = ['log_ratio_{}'.format(replica) for replica in self.replicas]
         self.protein_groups[cols] = self.protein_groups[cols] * -1
+        self._data_changed()
+
+    def _data_changed(self):
+        self._data_version += 1
+        self._stages = {}
+        self._go_tests = {}
+        self.histograms = None
+        self._search_index = None
+
+    def _is_current(self, stage, inputs):
+        """Whether stage was last computed with inputs."""
+        return self._stages.get(stage) == inputs
         
\ No newline at end of file
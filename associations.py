@@ -0,0 +1,91 @@
+import os
+
+import pandas as pd
+import numpy as np
+
+from file_cache import cache_path, file_key, write_atomic
+
+
+STORE_FORMAT = '2' # Part of the store key, so older stores are rebuilt
+COLUMNS = ('proteins', 'protein_codes', 'go_ids', 'go_codes', 'aspects', 'aspect_codes')
+
+
+class AssociationStore(object):
+    """GO association (GAF) file compiled to categorical columns.
+
+    Protein accessions and GO ids are stored as categories plus int32
+    codes and the aspect (F, P or C) as an int8 code. The columns are
+    written once per GAF file as .npy files and memory-mapped on later
+    loads. The store is rebuilt when the file's size or mtime changes.
+    """
+
+    def __init__(self, file_path, cache=True):
+        self.file_path = file_path
+        if cache:
+            cache_dir = None if cache is True else cache
+            self.store_path = cache_path(file_path, 'gaf-{}', cache_dir)
+            if self._load(file_key(file_path, STORE_FORMAT)):
+                return
+        self._compile(file_path)
+        if cache:
+            self._save(file_key(file_path, STORE_FORMAT))
+
+    def __len__(self):
+        return len(self.protein_codes)
+
+    def _compile(self, file_path):
+        associations = pd.read_table(file_path, comment='!', header=None,
+            usecols=[1, 4, 8], names=['protein_id', 'go_id', 'class'], dtype=str)
+        protein_codes, proteins = pd.factorize(associations.protein_id)
+        go_codes, go_ids = pd.factorize(associations.go_id)
+        aspect_codes, aspects = pd.factorize(associations['class'])
+
+        # Blank fields have code -1, which would index the last category
+        rows = np.nonzero((protein_codes >= 0) & (go_codes >= 0) & (aspect_codes >= 0))[0]
+
+        # Drop duplicate rows, keeping the first occurrences in file order
+        keys = (protein_codes.astype(np.int64) * len(go_ids) + go_codes) * len(aspects) + aspect_codes
+        _, first = np.unique(keys[rows], return_index=True)
+        first = np.sort(rows[first])
+
+        self.proteins = np.asarray(proteins, dtype=str)
+        self.protein_codes = protein_codes[first].astype(np.int32)
+        self.go_ids = np.asarray(go_ids, dtype=str)
+        self.go_codes = go_codes[first].astype(np.int32)
+        self.aspects = np.asarray(aspects, dtype=str)
+        self.aspect_codes = aspect_codes[first].astype(np.int8)
+
+    def _load(self, key):
+        try:
+            stored_key = np.load(os.path.join(self.store_path, 'key.npy'))
+            if stored_key.tolist() != key.tolist():
+                return False
+            for column in COLUMNS:
+                path = os.path.join(self.store_path, '{}.npy'.format(column))
+                setattr(self, column, np.load(path, mmap_mode='r'))
+        except (IOError, OSError, ValueError):
+            return False
+        return True
+
+    def _save(self, key):
+        def write(path):
+            os.makedirs(path)
+            for column in COLUMNS:
+                np.save(os.path.join(path, '{}.npy'.format(column)), getattr(self, column))
+            np.save(os.path.join(path, 'key.npy'), key)
+        write_atomic(self.store_path, write)
+
+    def associations(self, protein_map):
+        """Return the protein_id, go_id, class frame mapped through protein_map.
+
+        protein_map is a Series from accession to protein group id;
+        associations of other accessions are dropped.
+        """
+        positions = pd.Index(protein_map.index).get_indexer(self.proteins)
+        mapped = positions[self.protein_codes]
+        keep = mapped >= 0
+        return pd.DataFrame({
+            'protein_id': protein_map.values[mapped[keep]],
+            'go_id': self.go_ids[self.go_codes[keep]],
+            'class': self.aspects[self.aspect_codes[keep]]})
+
@@ -0,0 +1,92 @@
+"""Benchmark the OBO tokenizers and the uncached GO DAG build.
+
+    python benchmarks/go_dag.py [--terms 47000] [--file go-basic.obo]
+
+Without --file a synthetic go-basic sized .obo (and .obo.gz) is written
+to a temporary directory. The line parser (fast=False) and the stanza
+tokenizer run side by side, followed by full uncached GODag and
+CompactGODag builds; the best of --repeat runs is reported.
+"""
+from __future__ import print_function
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from obo_parser import CompactGODag, GODag, OBOReader
+
+
+def write_obo(path, terms, seed=0):
+    rng = np.random.default_rng(seed)
+    roots = ['molecular_function', 'biological_process', 'cellular_component']
+    ids = [3674, 8150, 5575] + [int(n) for n in rng.choice(np.arange(10000, 9999999), terms, replace=False)]
+    by_level = {}
+    with open(path, 'w') as obo:
+        obo.write('format-version: 1.2\ndata-version: releases/2020-01-01\nontology: go\n\n')
+        for k, go_id in enumerate(ids):
+            namespace = k % 3
+            obo.write('[Term]\nid: GO:{:07d}\nname: term number {} of the ontology\n'
+                      'namespace: {}\n'.format(go_id, k, roots[namespace]))
+            if k and k % 10 == 0:
+                obo.write('alt_id: GO:{:07d}\n'.format(10000000 + k))
+            obo.write('def: "A long definition of the term with some words in it." [GOC:xyz]\n'
+                      'synonym: "term {}" EXACT []\nxref: Reactome:R-HSA-{}\n'.format(k, k))
+            if k >= 3:
+                level = min(1 + int(rng.exponential(5)), 14)
+                parents = by_level.get((namespace, level - 1)) or [namespace]
+                for parent in set(parents[i] for i in rng.integers(0, len(parents), 1 + (rng.random() < 0.25))):
+                    obo.write('is_a: GO:{:07d} ! parent\n'.format(ids[parent]))
+                by_level.setdefault((namespace, level), []).append(k)
+                if k % 7 == 0:
+                    obo.write('relationship: part_of GO:{:07d} ! part\n'.format(ids[rng.integers(0, k)]))
+            obo.write('\n')
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--terms', type=int, default=47000)
+    parser.add_argument('--file', help='existing .obo file to parse instead')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    try:
+        obo_path = args.file
+        if obo_path is None:
+            obo_path = os.path.join(directory, 'go-basic.obo')
+            write_obo(obo_path, args.terms)
+        gz_path = os.path.join(directory, 'go-basic.obo.gz')
+        with open(obo_path, 'rb') as obo, gzip.open(gz_path, 'wb') as gz:
+            shutil.copyfileobj(obo, gz)
+
+        print('{} ({:.0f} MB)'.format(obo_path, os.path.getsize(obo_path) / 2.**20))
+        runs = [
+            ('line parser', lambda: list(OBOReader(obo_path, fast=False))),
+            ('tokenizer', lambda: list(OBOReader(obo_path))),
+            ('tokenizer .gz', lambda: list(OBOReader(gz_path))),
+            ('GODag, uncached', lambda: GODag(obo_path, cache=False)),
+            ('CompactGODag, uncached', lambda: CompactGODag(obo_path, cache=False)),
+        ]
+        for name, function in runs:
+            print('{:<24}{:>8.2f} s'.format(name, best_time(function, args.repeat)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
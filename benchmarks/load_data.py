@@ -0,0 +1,110 @@
+"""Benchmark Analysis.load_data against the original loader.
+
+    python benchmarks/load_data.py [--rows 50000] [--samples 40] [--file proteinGroups.txt]
+
+Without --file a synthetic proteinGroups.txt is written to a temporary
+directory. Every loader runs --repeat times; the best time is reported
+with the tracemalloc peak of one more run.
+"""
+from __future__ import print_function
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis import Analysis
+
+
+def write_protein_groups(path, rows, samples, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = ['sp|P{:06d}|X_HUMAN'.format(i) for i in range(rows)]
+    columns = {'Protein IDs': ids, 'Majority protein IDs': ids,
+               'Gene names': ['G{}'.format(i) for i in range(rows)]}
+    for i in range(samples):
+        ratio = np.exp2(rng.normal(0, 1, rows))
+        ratio[rng.random(rows) < 0.02] = np.nan
+        columns['Ratio H/L normalized S{}'.format(i)] = ratio
+        columns['Ratio H/L S{}'.format(i)] = ratio
+        columns['Intensity S{}'.format(i)] = rng.lognormal(20, 2, rows)
+    columns['Reverse'] = np.where(rng.random(rows) < 0.02, '+', '')
+    columns['Potential contaminant'] = np.where(rng.random(rows) < 0.02, '+', '')
+    columns['id'] = np.arange(rows)
+    pd.DataFrame(columns).to_csv(path, sep='\t', index=False)
+
+
+def load_data_before(analysis, file_path):
+    # load_data before the columnar loader: a filter copy per flag and
+    # per ratio column, and one inserted log ratio column per sample.
+    columns = analysis._find_column_names(file_path)
+    protein_groups = pd.read_table(file_path, usecols=list(columns.keys()))
+    protein_groups.rename(columns=columns, inplace=True)
+    protein_groups = protein_groups[protein_groups.Reverse != '+']
+    protein_groups = protein_groups[protein_groups.contaminant != '+']
+    for column in columns.values():
+        if not column.startswith('ratio'): continue
+        protein_groups = protein_groups[pd.notnull(protein_groups[column])]
+        protein_groups['log_{}'.format(column)] = np.log2(protein_groups[column])
+    protein_groups.drop(['Reverse', 'contaminant'], axis=1, inplace=True)
+    return protein_groups
+
+
+def measure(load, repeat):
+    load()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--samples', type=int, default=40)
+    parser.add_argument('--file', help='existing proteinGroups.txt to load instead')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    directory = None
+    file_path = args.file
+    if file_path is None:
+        directory = tempfile.mkdtemp()
+        file_path = os.path.join(directory, 'proteinGroups.txt')
+        write_protein_groups(file_path, args.rows, args.samples)
+    try:
+        analysis = Analysis()
+        loaders = [('before', lambda: load_data_before(analysis, file_path)),
+                   ('c', lambda: analysis.load_data(file_path, engine='c'))]
+        if importlib.util.find_spec('pyarrow') is not None:
+            loaders.append(('pyarrow', lambda: analysis.load_data(file_path, engine='pyarrow')))
+        else:
+            print('pyarrow is not installed, skipping its engine', file=sys.stderr)
+
+        print('{} ({:.0f} MB), pandas {}'.format(
+            file_path, os.path.getsize(file_path) / 2.**20, pd.__version__))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+            for name, load in loaders:
+                seconds, peak = measure(load, args.repeat)
+                print('{:<10}{:>8.2f} s{:>8.0f} MB peak'.format(name, seconds, peak / 2.**20))
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,43 @@ from parameters import Ui_Form
 from search_dialog import SearchDialog
 
 
+class StepWorker(QtCore.QObject):
+    """Runs analysis steps one after another on a worker thread.
+
+    Every step is a (message, function, tab) tuple; tab is the tab to
+    show once the step is done, or None. A function returning False had
+    nothing to recompute, its tab is only rebuilt if it is missing.
+    Cancelling stops the run before the next step, a running step is
+    always finished.
+    """
+    step_started = QtCore.Signal(int, str)
+    step_done = QtCore.Signal(int, bool) # tab, changed
+    failed = QtCore.Signal(str)
+    finished = QtCore.Signal()
+
+    def __init__(self, steps):
+        super(StepWorker, self).__init__()
+        self.steps = steps
+        self.cancelled = False
+
+    def run(self):
+        for i, (message, step, tab) in enumerate(self.steps):
+            if self.cancelled:
+                break
+            self.step_started.emit(i, message)
+            try:
+                changed = step()
+            except Exception as e:
+                self.failed.emit(str(e))
+                break
+            if tab is not None:
+                self.step_done.emit(tab, changed is not False)
+        self.finished.emit()
+
+
 class ParametersWidget(QtGui.QWidget, Ui_Form):
-    show_load = QtCore.Signal(bool)
-    add_tab = QtCore.Signal(int)
+    add_tab = QtCore.Signal(int, bool) # tab, changed
+    running = QtCore.Signal(bool)
 
     def __init__(self, parent, analysis):
         super(ParametersWidget, self).__init__(parent)
@@ -19,6 +53,10 @@ class ParametersWidget(QtGui.QWidget, Ui_Form):
         self.a = analysis
         self.db_loaded = False
         self.ass_loaded = False
+        self.step_thread = None
+        self.worker = None
+        self.error = None
+        self.cancelled = False
         self.set_up()
         
     def set_up(self):
@@ -31,6 +69,31 @@ class ParametersWidget(QtGui.QWidget, Ui_Form):
         self.go_run.clicked.connect(self.run_go)
         self.go_run_all.clicked.connect(self.go_run_all_clicked)
         
+        # Progress of the running steps
+        progress_layout = QtGui.QHBoxLayout()
+        self.progress_label = QtGui.QLabel('')
+        self.progress_bar = QtGui.QProgressBar()
+        self.cancel_button = QtGui.QPushButton('Annuleren')
+        self.cancel_button.clicked.connect(self.cancel)
+        progress_layout.addWidget(self.progress_label)
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+        self.gridLayout.addLayout(progress_layout, 1, 0, 1, 1)
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        
+    def show_parameters(self):
+        self.p_sig_a.setText(str(self.a.p_value))
+        self.bin_size_edit.setText(str(self.a.bin_size))
+        self.linkage_combo.setCurrentIndex(self.linkage_combo.findText(self.a.linkage))
+        self.distance_edit.setText(str(self.a.distance_treshold))
+        self.go_db_path.setText(self.a.database_path or '')
+        self.ass_path.setText(self.a.ass_path or '')
+        self.p_value_go_edit.setText(str(self.a.p_value_go))
+        self.go_combo.setCurrentIndex(self.go_combo.findText(self.a.ontology.name))
+        self.cluster_run.setEnabled('significant' in self.a.protein_groups)
+        self.go_run.setEnabled(self.a.z is not None)
+        
     def load_go(self):
         path, _ = QtGui.QFileDialog().getOpenFileName()
         self.a.database_path = path
@@ -44,55 +107,110 @@ class ParametersWidget(QtGui.QWidget, Ui_Form):
         self.ass_loaded = False
         
     def clust_run_all_clicked(self):
-        self.show_load.emit(True)
-        self.run_sig(False)
-        self.run_cluster(False)
-        self.show_load.emit(False)
+        self.run_steps(self.sig_steps() + self.cluster_steps())
 
     def go_run_all_clicked(self):
-        self.show_load.emit(True)
-        self.run_sig(False)
-        self.run_cluster(False)
-        self.run_go(False)
-        self.show_load.emit(False)
-
-    def run_sig(self, emit=True):
-        if emit: self.show_load.emit(True)
-        self.cluster_run.setEnabled(True)
-        self.go_run.setEnabled(False)
+        self.run_steps(self.sig_steps() + self.cluster_steps() + self.go_steps())
+
+    def run_sig(self):
+        self.run_steps(self.sig_steps())
+        
+    def run_cluster(self):
+        self.run_steps(self.cluster_steps())
+        
+    def run_go(self):
+        self.run_steps(self.go_steps())
+
+    def sig_steps(self):
         self.a.p_value = float(self.p_sig_a.text())
         if self.sig_b.isChecked():
             self.a.p_value = float(self.p_sig_b.text())
         self.a.bin_size = int(self.bin_size_edit.text())
-        self.a.find_significant()
-        self.add_tab.emit(1)
-        if emit: self.show_load.emit(False)
-        
-    def run_cluster(self, emit=True):
-        if emit: self.show_load.emit(True)
-        self.go_run.setEnabled(True)
+        # The index is built once per data, before the search button shows
+        return [('Zoekindex bouwen...', self.a.search_index, None),
+                ('Significantie berekenen...', self.a.find_significant, 1)]
+
+    def cluster_steps(self):
         self.a.distance_treshold = float(self.distance_edit.text())
         self.a.linkage = self.linkage_combo.currentText()
-        self.a.cluster()
-        self.add_tab.emit(2)
-        if emit: self.show_load.emit(False)
-        
-    def run_go(self, emit=True):
-        if emit: self.show_load.emit(True)
+        return [('Clusteren...', self.a.cluster, 2)]
+
+    def go_steps(self):
         self.a.p_value_go = float(self.p_value_go_edit.text())
         self.a.ontology = self.go_combo.currentText() 
+        steps = []
         if not self.db_loaded:
-            self.a.load_go_database()
-            QtGui.qApp.processEvents()
-            self.db_loaded = True
+            steps.append(('GO database laden...', self.load_go_database, None))
         if not self.ass_loaded:
-            self.a.load_associations()
-            QtGui.qApp.processEvents()
-            self.ass_loaded = True
-        for _ in self.a.iterate_go_terms():
-            QtGui.qApp.processEvents()
-        self.add_tab.emit(3)
-        if emit: self.show_load.emit(False)
+            steps.append(('Associaties laden...', self.load_associations, None))
+        steps.append(('GO termen zoeken...', self.a.find_go_terms, 3))
+        return steps
+
+    def load_go_database(self):
+        self.a.load_go_database()
+        self.db_loaded = True
+
+    def load_associations(self):
+        self.a.load_associations()
+        self.ass_loaded = True
+
+    def run_steps(self, steps):
+        self.error = None
+        self.cancelled = False
+        self.set_running(True)
+        self.progress_bar.setRange(0, len(steps))
+        self.step_thread = QtCore.QThread(self)
+        self.worker = StepWorker(steps)
+        self.worker.moveToThread(self.step_thread)
+        self.step_thread.started.connect(self.worker.run)
+        self.worker.step_started.connect(self.step_started)
+        self.worker.step_done.connect(self.step_done)
+        self.worker.failed.connect(self.step_failed)
+        self.worker.finished.connect(self.steps_finished)
+        self.worker.finished.connect(self.step_thread.quit)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.step_thread.finished.connect(self.step_thread.deleteLater)
+        self.step_thread.start()
+
+    def set_running(self, running):
+        for box in (self.groupBox_2, self.groupBox_3, self.groupBox):
+            box.setDisabled(running)
+        self.progress_bar.setVisible(running)
+        self.cancel_button.setVisible(running)
+        self.cancel_button.setEnabled(True)
+        self.running.emit(running)
+
+    def step_started(self, i, message):
+        self.progress_bar.setValue(i)
+        self.progress_label.setText(message)
+
+    def step_done(self, tab, changed):
+        if tab == 1:
+            self.cluster_run.setEnabled(True)
+            self.go_run.setEnabled(self.a.z is not None)
+        elif tab == 2:
+            self.go_run.setEnabled(True)
+        self.add_tab.emit(tab, changed)
+
+    def step_failed(self, message):
+        self.error = message
+
+    def steps_finished(self):
+        if self.error is not None:
+            self.progress_label.setText('Fout: {}'.format(self.error))
+        elif self.cancelled:
+            self.progress_label.setText('Geannuleerd')
+        else:
+            self.progress_label.setText('')
+        self.worker = None
+        self.set_running(False)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.cancelled = True
+            self.worker.cancelled = True
+            self.cancel_button.setEnabled(False)
+            self.progress_label.setText('Annuleren na deze stap...')
 
 
 class CentralWidget(QtGui.QWidget):
@@ -120,11 +238,11 @@ class CentralWidget(QtGui.QWidget):
 
     def set_up(self):
         # Init parameter widget
-        parameters_widget = ParametersWidget(self, self.analysis)
-        parameters_widget.add_tab.connect(self.set_tabs)
-        parameters_widget.show_load.connect(self.show_load)
+        self.parameters_widget = ParametersWidget(self, self.analysis)
+        self.parameters_widget.add_tab.connect(self.set_tabs)
+        self.parameters_widget.running.connect(self.set_running)
         self.tab_widget = QtGui.QTabWidget(self)
-        self.tab_widget.addTab(parameters_widget, 'Parameters')
+        self.tab_widget.addTab(self.parameters_widget, 'Parameters')
         self.tab_widget.currentChanged.connect(self.tab_changed)
         self.setLayout(QtGui.QHBoxLayout())
         self.layout().addWidget(self.tab_widget)
@@ -135,9 +253,23 @@ class CentralWidget(QtGui.QWidget):
         self.corner_widget.hide()
         self.tab_widget.setCornerWidget(self.corner_widget)
         
-    def show_load(self, show):
-        self.setDisabled(show)
-        QtGui.qApp.processEvents()
+    def set_running(self, running):
+        # Searching waits for the search index
+        self.corner_widget.setDisabled(running)
+
+    def show_analysis(self):
+        # Tabs of the steps that were already run, e.g. in a saved session
+        self.parameters_widget.show_parameters()
+        self.parameters_widget.run_steps(
+            [('Zoekindex bouwen...', self.analysis.search_index, None)])
+        if 'significant' in self.analysis.protein_groups:
+            self.set_tabs(1)
+        if self.analysis.z is not None:
+            self.set_tabs(2)
+        if len(self.analysis.go_terms.index) > 0 and self.analysis.database_path:
+            self.analysis.load_go_database()
+            self.parameters_widget.db_loaded = True
+            self.set_tabs(3)
         
     def tab_changed(self, index):
         self.corner_widget.hide()
@@ -155,7 +287,11 @@ class CentralWidget(QtGui.QWidget):
             file_name = '{}.{}'.format(file_name, extension)
         self.tab_widget.widget(2).fig.savefig(file_name)
         
-    def set_tabs(self, i):
+    def set_tabs(self, i, changed=True):
+        # Rebuilding a tab removes the ones after it, so an unchanged
+        # step still adds its tab when an earlier step removed it.
+        if not changed and self.tab_widget.count() > i:
+            return
         if i == 1:
             self.delete_tab(3)
             self.delete_tab(2)
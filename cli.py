@@ -0,0 +1,259 @@
+"""Run the analysis pipeline without the GUI.
+
+    python cli.py proteinGroups.txt -o results --go-database go.obo --associations gaf.txt
+
+Parameters can also be read from a JSON config file with the keys of a
+saved session's manifest, e.g. {"p_value": 0.01, "linkage": "complete"}.
+Flags given on the command line override the config file.
+
+The per sample steps of a file run on threads (--threads). Given several
+files, they are processed in parallel by a pool of worker processes (-j). The GO dag and the association store are loaded once,
+before the workers are forked, and shared by all of them. Each file's
+tables go to a subdirectory of the output directory and a summary.tsv
+with one row per file is written next to them.
+"""
+from __future__ import print_function
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import pandas as pd
+
+from analysis import Analysis
+from associations import AssociationStore
+from obo_parser import CompactGODag
+
+
+ONTOLOGIES = ('Molecular function', 'Biological process', 'Cellular component')
+
+# GO dag and association store shared by the worker processes
+_shared = {}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='SILAC proteinGroups.txt analysis')
+    parser.add_argument('pg_paths', nargs='*', metavar='pg_path',
+                        help='MaxQuant proteinGroups.txt, one or more')
+    parser.add_argument('-o', '--output', default='.', help='directory for the result tables')
+    parser.add_argument('-c', '--config', help='JSON file with analysis parameters')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='worker processes for several files (default: all cores)')
+    parser.add_argument('--threads', dest='n_jobs', type=int,
+                        help='threads per file for the per sample steps '
+                             '(default: all cores, shared by the worker processes)')
+    parser.add_argument('--samples', help='comma separated samples to use (default: all)')
+    parser.add_argument('--replicas', help='comma separated replica of each sample')
+    parser.add_argument('--swap', action='store_true', default=None,
+                        help='replicas are label swapped')
+    parser.add_argument('--id-regex', dest='id_regex')
+    parser.add_argument('--csv-engine', dest='csv_engine', choices=['c', 'pyarrow'])
+    parser.add_argument('--bin-size', dest='bin_size', type=int)
+    parser.add_argument('--p-value', dest='p_value', type=float)
+    parser.add_argument('--linkage', choices=['average', 'single', 'complete', 'centroid', 'kmeans'],
+                        help="'kmeans': k-means pre-clusters, then average linkage (large sets)")
+    parser.add_argument('--kmeans-clusters', dest='kmeans_clusters', type=int)
+    parser.add_argument('--distance-treshold', dest='distance_treshold', type=float)
+    parser.add_argument('--no-cluster', dest='cluster', action='store_false', default=None)
+    parser.add_argument('--go-database', dest='database_path', help='GO .obo file')
+    parser.add_argument('--associations', dest='ass_path', help='GO association (GAF) file')
+    parser.add_argument('--ontology', action='append', choices=ONTOLOGIES,
+                        help='may be given more than once (default: all)')
+    parser.add_argument('--p-value-go', dest='p_value_go', type=float)
+    parser.add_argument('--go-alternative', dest='go_alternative',
+                        choices=['two-sided', 'greater', 'less'])
+    parser.add_argument('--snapshot', help='also save the session to this directory')
+    args = parser.parse_args(argv)
+
+    parameters = {}
+    if args.config is not None:
+        with open(args.config) as config:
+            parameters.update(json.load(config))
+    if parameters.get('pg_path') is not None:
+        parameters.setdefault('pg_paths', [parameters['pg_path']])
+    for name, value in vars(args).items():
+        if value is not None and value != [] and name != 'config':
+            parameters[name] = value
+    for name in ('samples', 'replicas'):
+        if isinstance(parameters.get(name), str):
+            parameters[name] = parameters[name].split(',')
+    if isinstance(parameters.get('ontology'), str):
+        parameters['ontology'] = [parameters['ontology']]
+    if not parameters.get('pg_paths'):
+        parser.error('no proteinGroups.txt given')
+    return parameters
+
+
+def log(message, start):
+    print('{:<24}{:.2f}s'.format(message, time.time() - start), file=sys.stderr)
+
+
+def load_shared(database_path, ass_path):
+    if database_path:
+        _shared['go_dag'] = CompactGODag(database_path)
+    if ass_path:
+        _shared['association_store'] = AssociationStore(ass_path)
+
+
+def run(pg_path, parameters, verbose=True):
+    analysis = Analysis()
+    analysis.csv_engine = parameters.get('csv_engine', analysis.csv_engine)
+    analysis.go_dag = _shared.get('go_dag')
+    analysis.association_store = _shared.get('association_store')
+    start = time.time()
+    analysis.pg_path = pg_path
+    analysis.load_data(pg_path)
+    if verbose: log('load_data', start)
+
+    samples = parameters.get('samples', analysis.samples)
+    replicas = parameters.get('replicas', [])
+    unknown = set(samples + replicas) - set(analysis.samples)
+    if unknown:
+        raise Exception('Unknown samples: {}'.format(', '.join(sorted(unknown))))
+    analysis.samples, analysis.replicas = samples, replicas
+    if parameters.get('swap'):
+        analysis.swap_replicas()
+    for name in ('id_regex', 'bin_size', 'p_value', 'linkage', 'distance_treshold', 'kmeans_clusters',
+                 'database_path', 'ass_path', 'p_value_go', 'go_alternative', 'n_jobs'):
+        if name in parameters:
+            setattr(analysis, name, parameters[name])
+
+    start = time.time()
+    analysis.find_significant()
+    if verbose: log('find_significant', start)
+    if parameters.get('cluster', True):
+        start = time.time()
+        analysis.cluster()
+        if verbose: log('cluster', start)
+
+    go_terms, go_term_proteins = [], []
+    if analysis.database_path and analysis.ass_path:
+        start = time.time()
+        if analysis.go_dag is None:
+            analysis.load_go_database()
+        analysis.load_associations()
+        if verbose: log('load GO', start)
+        for name in parameters.get('ontology', ONTOLOGIES):
+            start = time.time()
+            analysis.ontology = name
+            analysis.find_go_terms()
+            if verbose: log('find_go_terms {}'.format(analysis.ontology.letter), start)
+            terms = analysis.go_terms.reset_index()
+            terms.insert(0, 'ontology', name)
+            dag = analysis.go_dag
+            terms.insert(2, 'name', [dag[go_id].name if go_id in dag else ''
+                                     for go_id in terms.go_id])
+            go_terms.append(terms)
+            proteins = analysis.go_term_proteins.copy()
+            proteins.insert(0, 'ontology', name)
+            go_term_proteins.append(proteins)
+    return analysis, go_terms, go_term_proteins
+
+
+def write_results(output, analysis, go_terms, go_term_proteins):
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    analysis.protein_groups.to_csv(os.path.join(output, 'protein_groups.tsv'),
+                                   sep='\t', index=False)
+    if go_terms:
+        pd.concat(go_terms).to_csv(os.path.join(output, 'go_terms.tsv'),
+                                   sep='\t', index=False)
+        pd.concat(go_term_proteins).to_csv(os.path.join(output, 'go_term_proteins.tsv'),
+                                           sep='\t', index=False)
+
+
+def process_file(pg_path, name, parameters, verbose=False):
+    """Run and write one file; returns its row of the batch summary."""
+    start = time.time()
+    summary = {'name': name, 'pg_path': pg_path}
+    try:
+        analysis, go_terms, go_term_proteins = run(pg_path, parameters, verbose)
+        write_results(os.path.join(parameters['output'], name),
+                      analysis, go_terms, go_term_proteins)
+        if parameters.get('snapshot'):
+            analysis.save_snapshot(os.path.join(parameters['snapshot'], name))
+    except Exception as e:
+        summary['error'] = str(e)
+    else:
+        pgs = analysis.protein_groups
+        summary['protein_groups'] = len(pgs.index)
+        summary['significant'] = int(pgs.significant.sum())
+        if 'cluster' in pgs:
+            summary['clusters'] = pgs.cluster.nunique()
+        summary['go_terms'] = sum(len(terms.index) for terms in go_terms)
+    summary['seconds'] = round(time.time() - start, 3)
+    return summary
+
+
+def result_names(pg_paths):
+    # proteinGroups.txt files usually only differ in their directory
+    paths = [os.path.splitext(os.path.abspath(path))[0] for path in pg_paths]
+    if len(set(os.path.basename(path) for path in paths)) == 1:
+        paths = [os.path.dirname(path) for path in paths]
+    common = os.path.dirname(os.path.commonprefix(paths))
+    return [os.path.relpath(path, common).replace(os.sep, '_') for path in paths]
+
+
+def run_batch(parameters):
+    pg_paths = parameters['pg_paths']
+    start = time.time()
+    load_shared(parameters.get('database_path'), parameters.get('ass_path'))
+    if _shared: log('load GO', start)
+
+    # Forked workers inherit the loaded dag and store; elsewhere every
+    # worker loads them once, from the caches written above.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context, initializer, initargs = multiprocessing.get_context('fork'), None, ()
+    else:
+        context, initializer = None, load_shared
+        initargs = (parameters.get('database_path'), parameters.get('ass_path'))
+    jobs = min(parameters.get('jobs') or os.cpu_count(), len(pg_paths))
+    # The workers split the cores, unless the threads per file are given
+    if parameters.get('n_jobs') is None:
+        parameters = dict(parameters, n_jobs=max(os.cpu_count() // jobs, 1))
+    summaries = []
+    with ProcessPoolExecutor(jobs, mp_context=context, initializer=initializer,
+                             initargs=initargs) as executor:
+        futures = [executor.submit(process_file, pg_path, name, parameters)
+                   for pg_path, name in zip(pg_paths, result_names(pg_paths))]
+        for future in as_completed(futures):
+            summary = future.result()
+            if 'error' in summary:
+                print('{pg_path}: {error}'.format(**summary), file=sys.stderr)
+            else:
+                print('{name:<24}{seconds:.2f}s'.format(**summary), file=sys.stderr)
+            summaries.append(summary)
+
+    columns = ['name', 'pg_path', 'protein_groups', 'significant', 'clusters', 'go_terms',
+               'seconds', 'error']
+    summary = pd.DataFrame(summaries).reindex(columns=columns).sort_values('name').convert_dtypes()
+    if not os.path.isdir(parameters['output']):
+        os.makedirs(parameters['output'])
+    summary.to_csv(os.path.join(parameters['output'], 'summary.tsv'), sep='\t', index=False)
+    log('{} files, {} jobs'.format(len(pg_paths), jobs), start)
+    return summary
+
+
+def main(argv=None):
+    parameters = parse_args(argv)
+    if len(parameters['pg_paths']) > 1:
+        summary = run_batch(parameters)
+        return 1 if summary.error.notnull().any() else 0
+
+    pg_path = parameters['pg_paths'][0]
+    try:
+        analysis, go_terms, go_term_proteins = run(pg_path, parameters)
+    except Exception as e:
+        print('{}: {}'.format(pg_path, e), file=sys.stderr)
+        return 1
+    write_results(parameters['output'], analysis, go_terms, go_term_proteins)
+    if parameters.get('snapshot'):
+        analysis.save_snapshot(parameters['snapshot'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -30,21 +30,20 @@ class ClustersWidget(QtGui.QWidget):
         else:
             names = self.analysis.samples
         cols = ['log_ratio_{}'.format(name) for name in names]
-        D = significant.as_matrix(cols)
+        D = significant[cols].values
         
         # Compute and plot dendrogram.
         self.fig = pylab.figure(figsize=(8,8), facecolor='white')
         ax1 = self.fig.add_axes([0.01, 0.01, 0.2, 0.91])
-        Z1 = dendrogram(self.analysis.z, color_threshold=self.analysis.distance_treshold,
-                        orientation='left', no_labels=True)
+        dendrogram(self.analysis.z, color_threshold=self.analysis.distance_treshold,
+                   orientation='left', no_labels=True)
         plt.axvline(x=self.analysis.distance_treshold, color='k')
         ax1.xaxis.tick_top()
         ax1.set_yticks([])
 
         # Plot distance matrix.
         axmatrix = self.fig.add_axes([0.23, 0.01, 0.65, 0.91])
-        idx1 = Z1['leaves']
-        D = D[idx1,:]
+        D = self.analysis.leaf_rows(D)
         im = axmatrix.matshow(D, aspect='auto', origin='lower', cmap=pylab.cm.RdYlGn)
         axmatrix.set_xticklabels([''] + names)
         axmatrix.xaxis.set_ticks_position('none')
@@ -0,0 +1,50 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'bpsys')
+
+
+def cache_path(file_path, name, cache_dir=None):
+    """Path in cache_dir of the compiled form of file_path.
+
+    name is a format string for the file name, given the sha1 of the
+    absolute path, e.g. 'gaf-{}'.
+    """
+    digest = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR if cache_dir is None else cache_dir, name.format(digest))
+
+
+def file_key(file_path, *extra):
+    """Identify file_path by its path, size and mtime, plus any extra strings.
+
+    A compiled form is stale once its stored key differs.
+    """
+    stat = os.stat(file_path)
+    return np.array([os.path.abspath(file_path), str(stat.st_size), str(stat.st_mtime_ns)]
+                    + [str(value) for value in extra])
+
+
+def write_atomic(path, write):
+    """Call write with a temporary path and move the result to path.
+
+    Readers never see a half written file or directory. A cache that
+    cannot be written is skipped.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        write(tmp_path)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -88,8 +88,8 @@ class GOWidget(QtGui.QWidget):
         go_table.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
         go_table.clicked.connect(self.select_term)
         data = np.array(
-            [(term[0], float(term[1]), len(term[2])) 
-             for term in self.analysis.go_terms.values()],
+            [(go_id, float(p_value), int(proteins))
+             for go_id, p_value, proteins in self.analysis.go_terms.itertuples()],
             dtype=[('GO ID', object), ('P-waarde', float), ('Eiwitten', int)])
         go_table.setData(data)
 
@@ -127,12 +127,12 @@ class GOWidget(QtGui.QWidget):
 
         # Update table
         regex = re.compile(self.analysis.id_regex)
-        term = self.analysis.go_terms[self.go_id]
+        proteins = self.analysis.term_proteins(self.go_id)
         cols = ['protein_ids']
         cols += ['log_ratio_{}'.format(sample) for sample in self.samples]
         dtype = [('Eiwit', object)] + [(sample, float) for sample in self.samples]
         data = []
-        for row in term.proteins[cols].as_matrix():
+        for row in proteins[cols].values:
             id = regex.findall(row[0].split(';')[0])[0]
             data.append(tuple([id] + [float(x) for x in row[1:]]))
         data = np.array(data, dtype=dtype)
@@ -181,11 +181,11 @@ class GOWidget(QtGui.QWidget):
         return sug
         
     def term_to_color(self, term):
-        term = self.analysis.go_terms.get(term.id)
-        if term is None:
+        go_terms = self.analysis.go_terms
+        if term.id not in go_terms.index:
             return QtGui.QColor.fromRgbF(1, 1, 1)
-        size = len(term.proteins)
-        max_ = max([len(term.proteins) for term in self.analysis.go_terms.values()])
+        size = go_terms.proteins[term.id]
+        max_ = go_terms.proteins.max()
         return self.color_map.map([size / max_], mode='qcolor')[0]
 
     def ratio_to_color(self, ratio):
@@ -207,14 +207,53 @@ class MainWindow(QtGui.QMainWindow):
         menubar = self.menuBar()
         
         # File menu actions
-        open_action = QtGui.QAction('Open', self)
-        open_action.triggered.connect(self.start)
+        self.open_action = QtGui.QAction('Open', self)
+        self.open_action.triggered.connect(self.start)
+        self.open_session_action = QtGui.QAction('Sessie openen...', self)
+        self.open_session_action.triggered.connect(self.open_session)
+        self.save_session_action = QtGui.QAction('Sessie opslaan...', self)
+        self.save_session_action.triggered.connect(self.save_session)
+        self.save_session_action.setEnabled(False)
         
         file_menu = menubar.addMenu('File')
-        file_menu.addAction(open_action)
+        file_menu.addAction(self.open_action)
+        file_menu.addSeparator()
+        file_menu.addAction(self.open_session_action)
+        file_menu.addAction(self.save_session_action)
 
     def start(self):
         ok = LoadProteinGroupsDialog.get_file_info(self, self.analysis)
         if ok:
-            central_widget = CentralWidget(self.analysis, self)
-            self.setCentralWidget(central_widget)
+            self.set_central_widget(CentralWidget(self.analysis, self))
+            
+    def open_session(self):
+        path = QtGui.QFileDialog.getExistingDirectory(self, 'Sessie openen')
+        if not path:
+            return
+        try:
+            self.analysis.load_snapshot(path)
+        except Exception as e:
+            QtGui.QMessageBox.warning(self, 'Sessie openen', str(e))
+            return
+        central_widget = CentralWidget(self.analysis, self)
+        self.set_central_widget(central_widget)
+        central_widget.show_analysis()
+        
+    def set_central_widget(self, central_widget):
+        central_widget.parameters_widget.running.connect(self.set_running)
+        self.setCentralWidget(central_widget)
+        self.save_session_action.setEnabled(True)
+
+    def set_running(self, running):
+        # The running steps own the analysis and the central widget
+        for action in (self.open_action, self.open_session_action, self.save_session_action):
+            action.setDisabled(running)
+
+    def save_session(self):
+        path, _ = QtGui.QFileDialog.getSaveFileName(self, 'Sessie opslaan')
+        if not path:
+            return
+        try:
+            self.analysis.save_snapshot(path)
+        except Exception as e:
+            QtGui.QMessageBox.warning(self, 'Sessie opslaan', str(e))
@@ -1,34 +1,173 @@
+import functools
+
 from PySide import QtCore, QtGui
+import numpy as np
 
 
 class PandasModel(QtCore.QAbstractTableModel):
-    def __init__(self, protein_groups, sample, max_p=None, parent=None):
-        super(PandasModel, self).__init__(parent=parent)
+    """Table of one sample's protein groups.
 
-        cols = ['id', 'protein_ids', 'log_ratio_{}'.format(sample),
+    The columns are kept as the frame's numpy arrays, without a copy.
+    Cells are formatted when painted; the most recent ones are kept in
+    a small LRU cache. Filtering and sorting is done by a
+    ProteinTableProxy on top of it.
+    """
+    headers = ['protein_ids', 'log_ratio', 'intensity', 'p-value']
+
+    def __init__(self, protein_groups, sample, parent=None):
+        super(PandasModel, self).__init__(parent=parent)
+        cols = ['protein_ids', 'log_ratio_{}'.format(sample),
                 'intensity_{}'.format(sample), 'p_{}'.format(sample)]
-        data = protein_groups[cols]
-        if max_p is not None:
-            data = data[data['p_{}'.format(sample)] < max_p]
-        data.columns = ['id', 'protein_ids', 'log_ratio', 'intensity', 'p-value']
-        self._data = data
+        self.ids = protein_groups['id'].values
+        self.columns = [protein_groups[col].values for col in cols]
+        self.row_of_id = {pg_id: row for row, pg_id in enumerate(self.ids.tolist())}
+        self._cell_text = functools.lru_cache(maxsize=4096)(self._format_cell)
 
     def rowCount(self, parent=None):
-        return len(self._data.index)
+        return len(self.ids)
 
     def columnCount(self, parent=None):
         return 4
 
+    def _format_cell(self, row, col):
+        return str(self.columns[col][row])
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if index.isValid():
+            if role == QtCore.Qt.DisplayRole:
+                return self._cell_text(index.row(), index.column())
+        return None
+
+    def headerData(self, col, orientation, role):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.headers[col]
+        return None
+
+
+class ProteinTableProxy(QtGui.QAbstractProxyModel):
+    """Sorted and p value filtered view of a PandasModel.
+
+    The visible rows are an index array into the source model. The
+    argsort of every column and the mask of every p value cutoff are
+    computed once, so sorting or filtering only swaps that array.
+    """
+    def __init__(self, source, parent=None):
+        super(ProteinTableProxy, self).__init__(parent=parent)
+        self.setSourceModel(source)
+        self._orders = {}
+        self._masks = {}
+        self.sort_column = -1
+        self.sort_order = QtCore.Qt.AscendingOrder
+        self.max_p = None
+        self._update_rows()
+
+    def _order(self, col):
+        if col not in self._orders:
+            self._orders[col] = np.argsort(self.sourceModel().columns[col], kind='stable')
+        return self._orders[col]
+
+    def _mask(self, max_p):
+        if max_p not in self._masks:
+            self._masks[max_p] = self.sourceModel().columns[3] < max_p
+        return self._masks[max_p]
+
+    def _update_rows(self):
+        source = self.sourceModel()
+        if self.sort_column < 0:
+            rows = np.arange(source.rowCount())
+        else:
+            rows = self._order(self.sort_column)
+            if self.sort_order == QtCore.Qt.DescendingOrder:
+                rows = rows[::-1]
+        if self.max_p is not None:
+            rows = rows[self._mask(self.max_p)[rows]]
+        self.rows = rows
+        self.positions = np.full(source.rowCount(), -1)
+        self.positions[rows] = np.arange(len(rows))
+
+    def set_max_p(self, max_p):
+        self.beginResetModel()
+        self.max_p = max_p
+        self._update_rows()
+        self.endResetModel()
+
+    def sort(self, col, order=QtCore.Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        # Keep the selection on the same protein groups
+        persistent = self.persistentIndexList()
+        source_indexes = [self.mapToSource(index) for index in persistent]
+        self.sort_column, self.sort_order = col, order
+        self._update_rows()
+        self.changePersistentIndexList(
+            persistent, [self.mapFromSource(index) for index in source_indexes])
+        self.layoutChanged.emit()
+
+    def find_row(self, pg_id):
+        """Row of protein group pg_id in the table, or -1 if it is filtered out."""
+        source_row = self.sourceModel().row_of_id.get(pg_id)
+        return -1 if source_row is None else int(self.positions[source_row])
+
+    def mapToSource(self, index):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return QtCore.QModelIndex()
+        return self.sourceModel().index(int(self.rows[index.row()]), index.column())
+
+    def mapFromSource(self, index):
+        if not index.isValid() or self.positions[index.row()] < 0:
+            return QtCore.QModelIndex()
+        return self.index(int(self.positions[index.row()]), index.column())
+
+    def headerData(self, col, orientation, role):
+        return self.sourceModel().headerData(col, orientation, role)
+
+    def index(self, row, col, parent=QtCore.QModelIndex()):
+        return self.createIndex(row, col)
+
+    def parent(self, index):
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return self.sourceModel().columnCount()
+
+
+class SearchResultModel(QtCore.QAbstractTableModel):
+    """Protein groups found by a SearchIndex, as rows of protein_groups."""
+    def __init__(self, protein_groups, parent=None):
+        super(SearchResultModel, self).__init__(parent=parent)
+        cols = [col for col in ('protein_ids', 'gene_names') if col in protein_groups]
+        self.headers = [{'protein_ids': 'Protein IDs', 'gene_names': 'Gene names'}[col]
+                        for col in cols]
+        self.ids = protein_groups['id'].values
+        self.columns = [protein_groups[col].values for col in cols]
+        self.rows = np.empty(0, dtype=np.int64)
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def pg_id(self, row):
+        return int(self.ids[self.rows[row]])
+
+    def rowCount(self, parent=None):
+        return len(self.rows)
+
+    def columnCount(self, parent=None):
+        return len(self.columns)
+
     def data(self, index, role=QtCore.Qt.DisplayRole):
         if index.isValid():
             if role == QtCore.Qt.DisplayRole:
-                protein_group = self._data.values[index.row()]
-                return str(self._data.values[index.row()][index.column() + 1])
+                value = self.columns[index.column()][self.rows[index.row()]]
+                return '' if value is None or value != value else str(value)
         return None
 
     def headerData(self, col, orientation, role):
         if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
-            return self._data.columns[col + 1]
+            return self.headers[col]
         return None
 
 
@@ -38,7 +177,7 @@ class GOModel(QtCore.QAbstractTableModel):
         self._data = analysis
 
     def rowCount(self, parent=None):
-        return len(self._data.go_terms)
+        return len(self._data.go_terms.index)
 
     def columnCount(self, parent=None):
         return 3
@@ -46,12 +185,11 @@ class GOModel(QtCore.QAbstractTableModel):
     def data(self, index, role=QtCore.Qt.DisplayRole):
         if index.isValid():
             if role == QtCore.Qt.DisplayRole:
-                terms = list(self._data.go_terms.values())
-                term = terms[index.row()]
+                go_terms = self._data.go_terms
                 col = index.column()
-                if col < 2:
-                    return str(term[col])
-                return str(len(term.proteins))
+                if col == 0:
+                    return str(go_terms.index[index.row()])
+                return str(go_terms.iat[index.row(), col - 1])
         return None
 
     def headerData(self, col, orientation, role):
@@ -10,12 +10,22 @@ from __future__ import print_function
 import sys
 import os
 import re
+import gzip
+from itertools import chain
+
+import numpy as np
+
+from file_cache import cache_path, file_key, write_atomic
 
 GraphEngines = ("pygraphviz", "pydot")
 
 __copyright__ = "Copyright (C) 2010-2016, H Tang et al., All rights reserved."
 __author__ = "various"
 
+# A line that is empty after stripping ends a stanza
+_STANZA_END = re.compile(r"\n[ \t\r\f\v]*\n")
+
+
 class OBOReader(object):
     """Read goatools.org's obo file. Load into this iterable class.
 
@@ -26,9 +36,14 @@ class OBOReader(object):
                 print rec
     """
 
-    def __init__(self, obo_file="go-basic.obo", optional_attrs=None):
-        """Read obo file. Load dictionary."""
+    def __init__(self, obo_file="go-basic.obo", optional_attrs=None, fast=True):
+        """Read obo file. Load dictionary.
+
+          fast selects the stanza tokenizer over the line-by-line parser.
+          Both read plain and gzip-compressed (.obo.gz) files.
+        """
         self._init_optional_attrs(optional_attrs)
+        self.fast = fast
         self.format_version = None
         self.data_version = None
         # True if obo file exists or if a link to an obo file exists.
@@ -42,9 +57,15 @@ class OBOReader(object):
 
     def __iter__(self):
         """Return one GO Term record at a time from an obo file."""
+        if self.fast:
+            return self._iter_stanzas()
+        return self._iter_lines()
+
+    def _iter_lines(self):
+        """Return one GO Term record at a time, parsing line by line."""
         # Written by DV Klopfenstein
         # Wait to open file until needed. Automatically close file when done.
-        with open(self.obo_file) as fstream:
+        with _open_obo(self.obo_file) as fstream:
             rec_curr = None # Stores current GO Term
             for lnum, line in enumerate(fstream):
                 # obo lines start with any of: [Term], [Typedef], /^\S+:/, or /^\s*/
@@ -68,6 +89,102 @@ class OBOReader(object):
             if rec_curr is not None:
                 yield rec_curr
 
+    def _iter_stanzas(self, chunk_size=1 << 20):
+        """Return one GO Term record at a time, parsing whole stanzas.
+
+          The file is read in large chunks and split on blank lines, which
+          may hold whitespace as in the line parser. Tag and value are split
+          with str.partition and dispatched through a table; tags that are
+          neither required nor requested are skipped first.
+        """
+        with _open_obo(self.obo_file) as fstream:
+            lnum = 0 # Line number of the current stanza
+            rest = ""
+            header = True
+            while True:
+                chunk = fstream.read(chunk_size)
+                stanzas = _STANZA_END.split(rest + chunk)
+                # The last piece may continue in the next chunk
+                rest = stanzas.pop() if chunk else ""
+                for stanza in stanzas:
+                    start = lnum
+                    lnum += stanza.count("\n") + 2
+                    text = stanza.lstrip()
+                    if not text:
+                        continue
+                    start += stanza[:len(stanza) - len(text)].count("\n")
+                    if header:
+                        header = False
+                        if text[0:1] != "[":
+                            self._init_obo_header(text)
+                            continue
+                    if text.startswith("[Term]"):
+                        yield self._parse_stanza(text, start)
+                if not chunk:
+                    break
+
+    def _init_obo_header(self, stanza):
+        """Save obo version and release from the header stanza."""
+        for line in stanza.split("\n"):
+            if self.data_version is not None:
+                break
+            self._init_obo_version(line + "\n")
+
+    def _parse_stanza(self, stanza, lnum):
+        """Build a GOTerm from the text of one [Term] stanza."""
+        rec = GOTerm()
+        handlers = self._stanza_handlers
+        optional = self.optional_attrs
+        lines = stanza.split("\n")
+        for offset, line in enumerate(lines[1:], 1):
+            tag, sep, value = line.partition(":")
+            handler = handlers.get(tag)
+            if handler is None and tag not in optional:
+                if line.startswith("[Term]"):
+                    self._die("PREVIOUS Term WAS NOT TERMINATED AS EXPECTED", lnum + offset)
+                elif not sep and line.strip() and not line.startswith("["):
+                    self._die("UNEXPECTED LINE CONTENT: {L}".format(L=line.rstrip()), lnum + offset)
+                continue
+            value = value.strip()
+            if not value or " " in tag:
+                self._die("UNEXPECTED FIELD CONTENT: {L}\n".format(L=line.rstrip()), lnum + offset)
+            if handler is None:
+                self.update_rec(rec, tag, value)
+            else:
+                handler(self, rec, value, lnum + offset)
+        return rec
+
+    def _set_id(self, rec, value, lnum):
+        self._chk_none(rec.id, lnum)
+        rec.id = value
+
+    def _add_alt_id(self, rec, value, lnum):
+        rec.alt_ids.append(value)
+
+    def _set_name(self, rec, value, lnum):
+        self._chk_none(rec.name, lnum)
+        rec.name = value
+
+    def _set_namespace(self, rec, value, lnum):
+        self._chk_none(rec.namespace, lnum)
+        rec.namespace = value
+
+    def _add_is_a(self, rec, value, lnum):
+        rec._parents.append(value.split()[0])
+
+    def _set_is_obsolete(self, rec, value, lnum):
+        if value == "true":
+            rec.is_obsolete = True
+
+    _stanza_handlers = {
+        "id": _set_id,
+        "alt_id": _add_alt_id,
+        "name": _set_name,
+        "namespace": _set_namespace,
+        "is_a": _add_is_a,
+        "is_obsolete": _set_is_obsolete,
+    }
+
     def _init_obo_version(self, line):
         """Save obo version and release."""
         if line[0:14] == "format-version":
@@ -168,13 +285,104 @@ class OBOReader(object):
 
     def _chk_none(self, init_val, lnum):
         """Expect these lines to be uninitialized."""
-        if init_val is None or init_val is "":
+        if init_val is None or init_val == "":
             return
         self._die("FIELD IS ALREADY INITIALIZED", lnum)
 
 
 
 
+def _open_obo(obo_file):
+    """Open an obo file as text, decompressing .gz files."""
+    if obo_file.endswith(".gz"):
+        return gzip.open(obo_file, "rt")
+    return open(obo_file)
+
+
+def _indptr(lists):
+    """CSR row pointers for a list of lists."""
+    indptr = np.zeros(len(lists) + 1, dtype=np.int32)
+    np.cumsum([len(l) for l in lists], out=indptr[1:])
+    return indptr
+
+
+def _transpose(indptr, indices):
+    """Transpose a square CSR adjacency; rows stay in ascending order."""
+    n = len(indptr) - 1
+    rows = np.repeat(np.arange(n, dtype=np.int32), np.diff(indptr))
+    t_indices = rows[np.argsort(indices, kind="stable")]
+    t_indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(indices, minlength=n), out=t_indptr[1:])
+    return t_indptr, t_indices
+
+
+def _topological_order(parents):
+    """Order term indices so that every term comes after all its parents."""
+    pending = [len(set(ps)) for ps in parents]
+    children = [[] for _ in parents]
+    for i, ps in enumerate(parents):
+        for p in set(ps):
+            children[p].append(i)
+    order = [i for i, count in enumerate(pending) if count == 0]
+    for i in order:
+        for c in children[i]:
+            pending[c] -= 1
+            if pending[c] == 0:
+                order.append(c)
+    return order
+
+
+def _find_cycle(parents, order):
+    """Return the term indices of one is_a cycle among the unordered terms."""
+    # Every term left out of the topological order has a parent that was
+    # left out too, so following such parents must eventually loop.
+    remaining = set(range(len(parents))) - set(order)
+    path, seen = [], {}
+    i = min(remaining)
+    while i not in seen:
+        seen[i] = len(path)
+        path.append(i)
+        i = next(p for p in parents[i] if p in remaining)
+    return path[seen[i]:] + [i]
+
+
+def _ranges(starts, counts):
+    """Concatenated np.arange(start, start + count) of every start and count."""
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(len(offsets))
+
+
+def _ancestor_closure(parent_indptr, parent_indices, depths):
+    """Return the sorted ancestor indices of every term as CSR arrays.
+
+      The parents of a term are all less deep, so the closures are built
+      one depth at a time from the parents and their closures.
+    """
+    n = len(depths)
+    starts = np.zeros(n, dtype=np.int64)
+    counts = np.zeros(n, dtype=np.int64)
+    closure = np.empty(0, dtype=np.int64) # Closures of the terms, by depth
+    edge_terms = np.repeat(np.arange(n, dtype=np.int64), np.diff(parent_indptr))
+    order = np.argsort(depths[edge_terms], kind="stable")
+    edge_terms = edge_terms[order]
+    edge_parents = parent_indices[order].astype(np.int64)
+    bounds = np.searchsorted(depths[edge_terms], np.arange(depths.max() + 2 if n else 1))
+    for start, stop in zip(bounds[1:-1], bounds[2:]):
+        terms, parents = edge_terms[start:stop], edge_parents[start:stop]
+        inherited = closure[_ranges(starts[parents], counts[parents])]
+        # Unique (term, ancestor) keys, sorted on term and then ancestor
+        keys = np.unique(np.concatenate([
+            terms << 32 | parents,
+            np.repeat(terms, counts[parents]) << 32 | inherited]))
+        terms, first, term_counts = np.unique(keys >> 32, return_index=True, return_counts=True)
+        starts[terms] = len(closure) + first
+        counts[terms] = term_counts
+        closure = np.concatenate([closure, keys & 0xffffffff])
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, closure[_ranges(starts, counts)].astype(np.int32)
+
+
 class GOTerm:
     """
     GO term, actually contain a lot more properties than interfaced here
@@ -191,6 +399,8 @@ class GOTerm:
         self.depth = None           # longest distance from root node
         self.is_obsolete = False    # is_obsolete
         self.alt_ids = []           # alternative identifiers
+        self._ancestors = frozenset()   # ids of all parents, set by GODag
+        self._descendants = frozenset() # ids of all children, set by GODag
 
     def __str__(self):
         obsolete = "obsolete" if self.is_obsolete else ""
@@ -211,43 +421,39 @@ class GOTerm:
         return "\n  ".join(ret)
 
     def has_parent(self, term):
-        for p in self.parents:
-            if p.id == term or p.has_parent(term):
-                return True
-        return False
+        return term in self._ancestors
 
     def has_child(self, term):
-        for p in self.children:
-            if p.id == term or p.has_child(term):
-                return True
-        return False
+        return term in self._descendants
 
     def get_all_parents(self):
-        all_parents = set()
-        for p in self.parents:
-            all_parents.add(p.id)
-            all_parents |= p.get_all_parents()
-        return all_parents
+        return set(self._ancestors)
 
     def get_all_children(self):
-        all_children = set()
-        for p in self.children:
-            all_children.add(p.id)
-            all_children |= p.get_all_children()
-        return all_children
+        return set(self._descendants)
 
     def get_all_parent_edges(self):
         all_parent_edges = set()
-        for p in self.parents:
-            all_parent_edges.add((self.id, p.id))
-            all_parent_edges |= p.get_all_parent_edges()
+        stack, seen = [self], set([self.id])
+        while stack:
+            rec = stack.pop()
+            for p in rec.parents:
+                all_parent_edges.add((rec.id, p.id))
+                if p.id not in seen:
+                    seen.add(p.id)
+                    stack.append(p)
         return all_parent_edges
 
     def get_all_child_edges(self):
         all_child_edges = set()
-        for p in self.children:
-            all_child_edges.add((p.id, self.id))
-            all_child_edges |= p.get_all_child_edges()
+        stack, seen = [self], set([self.id])
+        while stack:
+            rec = stack.pop()
+            for p in rec.children:
+                all_child_edges.add((p.id, rec.id))
+                if p.id not in seen:
+                    seen.add(p.id)
+                    stack.append(p)
         return all_child_edges
 
     def write_hier_rec(self, gos_printed, out=sys.stdout,
@@ -289,54 +495,204 @@ class GOTerm:
                 depth, dp)
 
 
+_DAG_CACHE_FORMAT = "3"  # Part of the cache key; older caches are recompiled
+
+# String columns of the compiled DAG; stored as newline-joined utf-8.
+_DAG_STRINGS = ("ids", "names", "namespaces", "alt_ids")
+
+
+def _obo_cache_key(obo_file):
+    """Identify an obo file by its path, size, mtime and data-version."""
+    data_version = ""
+    with _open_obo(obo_file) as fstream:
+        for line in fstream:
+            if line[0:1] == "[":
+                break
+            if line[0:12] == "data-version":
+                data_version = line[14:].rstrip()
+    return file_key(obo_file, _DAG_CACHE_FORMAT, data_version)
+
+
+def _obo_cache_file(obo_file, cache_dir=None):
+    """Return the path of the compiled DAG for an obo file."""
+    return cache_path(obo_file, "godag-{}.npz", cache_dir)
+
+
+def _read_dag_cache(cache_file, key):
+    """Return the arrays of a compiled DAG; None if missing, stale or unreadable."""
+    try:
+        with np.load(cache_file, allow_pickle=False) as npz:
+            if npz["key"].tolist() != key.tolist():
+                return None
+            arrays = {name: npz[name] for name in npz.files if name != "key"}
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+    for name in _DAG_STRINGS:
+        text = arrays[name].tobytes().decode("utf-8")
+        arrays[name] = text.split("\n") if text else []
+    return arrays
+
+
+def _write_dag_cache(cache_file, key, arrays):
+    """Write a compiled DAG. A cache that cannot be written is skipped."""
+    arrays = dict(arrays)
+    for name in _DAG_STRINGS:
+        arrays[name] = np.frombuffer("\n".join(arrays[name]).encode("utf-8"), dtype=np.uint8)
+
+    def write(path):
+        with open(path, "wb") as fstream:
+            np.savez(fstream, key=key, **arrays)
+    write_atomic(cache_file, write)
+
+
+def _read_obo(obo_file, optional_attrs=None):
+    """Return the GO Term records of an obo file by id and alt_id."""
+    terms = {}
+    for rec in OBOReader(obo_file, optional_attrs):
+        terms[rec.id] = rec
+        for alt in rec.alt_ids:
+            terms[alt] = rec
+    return terms
+
+
+def _compile_dag(terms):
+    """Return the flat columns of a DAG given its records by id and alt_id.
+
+      Terms are visited in topological order, so level and depth take
+      one pass over the terms and edges.
+    """
+    recs = [rec for go_id, rec in terms.items() if go_id == rec.id]
+    index = {rec.id: i for i, rec in enumerate(recs)}
+    index.update((go_id, index[rec.id]) for go_id, rec in terms.items() if go_id != rec.id)
+    parents = [[index[p] for p in rec._parents] for rec in recs]
+
+    order = _topological_order(parents)
+    if len(order) < len(recs):
+        cycle = _find_cycle(parents, order)
+        raise Exception("GO DAG CONTAINS A CYCLE: {CYCLE}".format(
+            CYCLE=" is_a ".join(recs[i].id for i in cycle)))
+
+    levels = [0] * len(recs)
+    depths = [0] * len(recs)
+    for i in order:
+        if parents[i]:
+            levels[i] = min([levels[p] for p in parents[i]]) + 1
+            depths[i] = max([depths[p] for p in parents[i]]) + 1
+    parent_indptr = _indptr(parents)
+    parent_indices = np.fromiter(chain.from_iterable(parents), dtype=np.int32)
+    depths = np.array(depths, dtype=np.int32)
+    ancestor_indptr, ancestor_indices = _ancestor_closure(parent_indptr, parent_indices, depths)
+
+    return {
+        "ids": [rec.id for rec in recs],
+        "names": [rec.name for rec in recs],
+        "namespaces": [rec.namespace for rec in recs],
+        "is_obsolete": np.array([rec.is_obsolete for rec in recs], dtype=bool),
+        "levels": np.array(levels, dtype=np.int32),
+        "depths": depths,
+        "parent_indptr": parent_indptr,
+        "parent_indices": parent_indices,
+        "alt_indptr": _indptr([rec.alt_ids for rec in recs]),
+        "alt_ids": [alt for rec in recs for alt in rec.alt_ids],
+        "ancestor_indptr": ancestor_indptr,
+        "ancestor_indices": ancestor_indices,
+    }
+
+
 class GODag(dict):
 
-    def __init__(self, obo_file="go-basic.obo", optional_attrs=None):
-        self.load_obo_file(obo_file, optional_attrs)
+    def __init__(self, obo_file="go-basic.obo", optional_attrs=None, cache=True):
+        self.load_obo_file(obo_file, optional_attrs, cache)
 
-    def load_obo_file(self, obo_file, optional_attrs):
+    def load_obo_file(self, obo_file, optional_attrs, cache=True):
+        """Load the DAG, from the compiled cache when it is up to date.
 
-        reader = OBOReader(obo_file, optional_attrs)
-        for rec in reader:
-            self[rec.id] = rec
+          cache may be True (default cache directory), a directory or False.
+          Only the required fields are cached, so loading optional attrs
+          always parses the obo file. Returns the compiled columns, see
+          to_arrays().
+        """
+        cache_file = None
+        if cache and not optional_attrs:
+            cache_file = _obo_cache_file(obo_file, None if cache is True else cache)
+            key = _obo_cache_key(obo_file)
+            arrays = _read_dag_cache(cache_file, key)
+            if arrays is not None:
+                self.from_arrays(arrays)
+                return arrays
+
+        self.update(_read_obo(obo_file, optional_attrs))
+        arrays = self.populate_terms()
+        if cache_file is not None:
+            _write_dag_cache(cache_file, key, arrays)
+        return arrays
+
+    def to_arrays(self):
+        """Return the DAG as flat columns: term fields plus CSR parent, alt_id and ancestor lists."""
+        return _compile_dag(self)
+
+    def from_arrays(self, arrays):
+        """Fill the DAG from the columns made by to_arrays()."""
+        recs = []
+        names = arrays["names"]
+        namespaces = arrays["namespaces"]
+        is_obsolete = arrays["is_obsolete"].tolist()
+        alt_indptr = arrays["alt_indptr"].tolist()
+        alt_ids = arrays["alt_ids"]
+        for i, go_id in enumerate(arrays["ids"]):
+            rec = GOTerm()
+            rec.id = go_id
+            rec.name = names[i]
+            rec.namespace = namespaces[i]
+            rec.is_obsolete = is_obsolete[i]
+            rec.alt_ids = alt_ids[alt_indptr[i]:alt_indptr[i + 1]]
+            recs.append(rec)
+            self[go_id] = rec
             for alt in rec.alt_ids:
                 self[alt] = rec
-
-        self.populate_terms()
+        self._link(recs, arrays)
+        for rec in recs:
+            rec._parents = [p.id for p in rec.parents]
 
     def populate_terms(self):
+        """Link parent and child records and set level, depth and closures.
 
-        def _init_level(rec):
-            if rec.level is None:
-                if not rec.parents:
-                    rec.level = 0
-                else:
-                    rec.level = min(_init_level(rec) for rec in rec.parents) + 1
-            return rec.level
-
-        def _init_depth(rec):
-            if rec.depth is None:
-                if not rec.parents:
-                    rec.depth = 0
-                else:
-                    rec.depth = max(_init_depth(rec) for rec in rec.parents) + 1
-            return rec.depth
-
-        # make the parents references to the GO terms
-        for rec in self.values():
-            rec.parents = [self[x] for x in rec._parents]
-
-        # populate children and levels
-        for rec in self.values():
-            for p in rec.parents:
-                if rec not in p.children:
-                    p.children.append(rec)
-
-            if rec.level is None:
-                _init_level(rec)
-
-            if rec.depth is None:
-                _init_depth(rec)
+          Returns the compiled columns the records are linked from.
+        """
+        arrays = _compile_dag(self)
+        self._link(self._terms(), arrays)
+        return arrays
+
+    def _terms(self):
+        """Return the GO Term records, without alt_id duplicates."""
+        return [rec for go_id, rec in self.items() if go_id == rec.id]
+
+    def _link(self, recs, arrays):
+        """Set parents, children, level, depth and closures from the columns."""
+        levels = arrays["levels"].tolist()
+        depths = arrays["depths"].tolist()
+        parent_indptr = arrays["parent_indptr"].tolist()
+        parent_indices = arrays["parent_indices"].tolist()
+        for rec in recs:
+            rec.children = []
+        for i, rec in enumerate(recs):
+            rec.level = levels[i]
+            rec.depth = depths[i]
+            rec.parents = [recs[j] for j in parent_indices[parent_indptr[i]:parent_indptr[i + 1]]]
+            # children in term order and without duplicates
+            for p in dict.fromkeys(rec.parents):
+                p.children.append(rec)
+        self._init_closure(recs, arrays["ancestor_indptr"], arrays["ancestor_indices"])
+
+    def _init_closure(self, recs, indptr, indices):
+        """Store the transitive parents and children on every record."""
+        ids = np.array([rec.id for rec in recs], dtype=object)
+        descendant_indptr, descendant_indices = _transpose(indptr, indices)
+        ancestors, indptr = ids[indices].tolist(), indptr.tolist()
+        descendants, descendant_indptr = ids[descendant_indices].tolist(), descendant_indptr.tolist()
+        for i, rec in enumerate(recs):
+            rec._ancestors = frozenset(ancestors[indptr[i]:indptr[i + 1]])
+            rec._descendants = frozenset(descendants[descendant_indptr[i]:descendant_indptr[i + 1]])
 
     def write_dag(self, out=sys.stdout):
         """Write info for all GO Terms in obo file, sorted numerically."""
@@ -541,4 +897,206 @@ class GODag(dict):
         if bad_terms:
             print("terms not found: %s" % (bad_terms,), file=sys.stderr)
 
+
+class GOTermView(object):
+    """GOTerm interface onto one term of a CompactGODag.
+
+      Views are created on access and hold no data of their own.
+    """
+    __slots__ = ("dag", "index")
+
+    def __init__(self, dag, index):
+        self.dag = dag
+        self.index = index
+
+    @property
+    def id(self):
+        return self.dag.ids[self.index]
+
+    @property
+    def name(self):
+        return self.dag.names[self.index]
+
+    @property
+    def namespace(self):
+        return self.dag.namespace_names[self.dag.namespaces[self.index]]
+
+    @property
+    def level(self):
+        return int(self.dag.levels[self.index])
+
+    @property
+    def depth(self):
+        return int(self.dag.depths[self.index])
+
+    @property
+    def is_obsolete(self):
+        return bool(self.dag.is_obsolete[self.index])
+
+    @property
+    def alt_ids(self):
+        ptr = self.dag.alt_indptr
+        return self.dag.alt_ids[ptr[self.index]:ptr[self.index + 1]]
+
+    @property
+    def parents(self):
+        return self.dag.views(self.dag.parent_ids(self.index))
+
+    @property
+    def children(self):
+        return self.dag.views(self.dag.child_ids(self.index))
+
+    def __eq__(self, other):
+        return (isinstance(other, GOTermView) and other.dag is self.dag
+                and other.index == self.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def __repr__(self):
+        return "GOTermView('{ID}')".format(ID=self.id)
+
+    def has_parent(self, term):
+        return term in self.dag.index and self.dag.is_ancestor(self.dag.index[term], self.index)
+
+    def has_child(self, term):
+        return term in self.dag.index and self.dag.is_ancestor(self.index, self.dag.index[term])
+
+    def get_all_parents(self):
+        ids = self.dag.ids
+        return set(ids[a] for a in self.dag.ancestor_ids(self.index).tolist())
+
+    def get_all_children(self):
+        ids = self.dag.ids
+        return set(ids[d] for d in self.dag.descendant_ids(self.index).tolist())
+
+    def get_all_parent_edges(self):
+        dag, ids = self.dag, self.dag.ids
+        terms = [self.index] + dag.ancestor_ids(self.index).tolist()
+        return set((ids[t], ids[p]) for t in terms for p in dag.parent_ids(t).tolist())
+
+    def get_all_child_edges(self):
+        dag, ids = self.dag, self.dag.ids
+        terms = [self.index] + dag.descendant_ids(self.index).tolist()
+        return set((ids[c], ids[t]) for t in terms for c in dag.child_ids(t).tolist())
+
+    # The GOTerm algorithms only use the attributes above.
+    __str__ = GOTerm.__str__
+    write_hier_rec = GOTerm.write_hier_rec
+
+
+class CompactGODag(object):
+    """Array-backed GODag.
+
+      GO ids (including alt_ids) map to dense integers through `index`.
+      Parent and child edges are CSR arrays and level, depth, namespace
+      and obsolete flags are numpy columns; `dag[go_id]` returns a
+      GOTermView, so code written against GODag keeps working.
+    """
+
+    def __init__(self, obo_file="go-basic.obo", cache=True):
+        arrays = None
+        if cache:
+            cache_file = _obo_cache_file(obo_file, None if cache is True else cache)
+            key = _obo_cache_key(obo_file)
+            arrays = _read_dag_cache(cache_file, key)
+        if arrays is None:
+            # Compiled from the records, without linking them as a GODag
+            arrays = _compile_dag(_read_obo(obo_file))
+            if cache:
+                _write_dag_cache(cache_file, key, arrays)
+        self.from_arrays(arrays)
+
+    def from_arrays(self, arrays):
+        """Build the DAG from the columns made by GODag.to_arrays()."""
+        self.ids = arrays["ids"]
+        self.names = arrays["names"]
+        self.namespace_names, namespaces = np.unique(arrays["namespaces"], return_inverse=True)
+        self.namespace_names = self.namespace_names.tolist()
+        self.namespaces = namespaces.astype(np.int8)
+        self.is_obsolete = arrays["is_obsolete"]
+        self.levels = arrays["levels"]
+        self.depths = arrays["depths"]
+        self.alt_indptr = arrays["alt_indptr"]
+        self.alt_ids = arrays["alt_ids"]
+        self.parent_indptr = arrays["parent_indptr"]
+        self.parent_indices = arrays["parent_indices"]
+
+        # Children keep term order, as GODag builds them.
+        self.child_indptr, self.child_indices = _transpose(self.parent_indptr, self.parent_indices)
+
+        # Transitive closure: sorted ancestors of every term and its transpose.
+        self.ancestor_indptr = arrays["ancestor_indptr"]
+        self.ancestor_indices = arrays["ancestor_indices"]
+        self.descendant_indptr, self.descendant_indices = _transpose(
+            self.ancestor_indptr, self.ancestor_indices)
+
+        alt_terms = np.repeat(np.arange(len(self.ids)), np.diff(self.alt_indptr))
+        self.index = dict(zip(self.ids, range(len(self.ids))))
+        self.index.update(zip(self.alt_ids, alt_terms.tolist()))
+
+    def id2int(self, GO_id):
+        """Return the dense integer id of a GO id or alt_id."""
+        return self.index[GO_id]
+
+    def parent_ids(self, i):
+        return self.parent_indices[self.parent_indptr[i]:self.parent_indptr[i + 1]]
+
+    def child_ids(self, i):
+        return self.child_indices[self.child_indptr[i]:self.child_indptr[i + 1]]
+
+    def ancestor_ids(self, i):
+        return self.ancestor_indices[self.ancestor_indptr[i]:self.ancestor_indptr[i + 1]]
+
+    def descendant_ids(self, i):
+        return self.descendant_indices[self.descendant_indptr[i]:self.descendant_indptr[i + 1]]
+
+    def is_ancestor(self, j, i):
+        """True if term j is an ancestor of term i."""
+        ancestors = self.ancestor_ids(i)
+        k = np.searchsorted(ancestors, j)
+        return k < len(ancestors) and ancestors[k] == j
+
+    def views(self, indices):
+        return [GOTermView(self, int(i)) for i in indices]
+
+    def __getitem__(self, GO_id):
+        return GOTermView(self, self.index[GO_id])
+
+    def __contains__(self, GO_id):
+        return GO_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, GO_id, default=None):
+        return self[GO_id] if GO_id in self.index else default
+
+    def keys(self):
+        return self.index.keys()
+
+    def values(self):
+        return [GOTermView(self, i) for i in self.index.values()]
+
+    def items(self):
+        return [(go_id, GOTermView(self, i)) for go_id, i in self.index.items()]
+
+    # The GODag algorithms only use the mapping interface above.
+    write_dag = GODag.write_dag
+    write_hier_all = GODag.write_hier_all
+    write_hier = GODag.write_hier
+    query_term = GODag.query_term
+    paths_to_top = GODag.paths_to_top
+    _label_wrap = GODag._label_wrap
+    make_graph_pydot = GODag.make_graph_pydot
+    make_graph_pygraphviz = GODag.make_graph_pygraphviz
+    draw_lineage = GODag.draw_lineage
+    update_association = GODag.update_association
+
 # Copyright (C) 2010-2016, H Tang et al., All rights reserved.
@@ -95,6 +95,7 @@ class Ui_Form(object):
         self.linkage_combo.addItem("")
         self.linkage_combo.addItem("")
         self.linkage_combo.addItem("")
+        self.linkage_combo.addItem("")
         self.verticalLayout_6.addWidget(self.linkage_combo)
         self.label_5 = QtGui.QLabel(self.groupBox_3)
         self.label_5.setObjectName("label_5")
@@ -208,6 +209,7 @@ class Ui_Form(object):
         self.linkage_combo.setItemText(1, QtGui.QApplication.translate("Form", "single", None, QtGui.QApplication.UnicodeUTF8))
         self.linkage_combo.setItemText(2, QtGui.QApplication.translate("Form", "complete", None, QtGui.QApplication.UnicodeUTF8))
         self.linkage_combo.setItemText(3, QtGui.QApplication.translate("Form", "centroid", None, QtGui.QApplication.UnicodeUTF8))
+        self.linkage_combo.setItemText(4, QtGui.QApplication.translate("Form", "kmeans", None, QtGui.QApplication.UnicodeUTF8))
         self.label_5.setText(QtGui.QApplication.translate("Form", "Treshold", None, QtGui.QApplication.UnicodeUTF8))
         self.distance_edit.setText(QtGui.QApplication.translate("Form", "2", None, QtGui.QApplication.UnicodeUTF8))
         self.cluster_run.setText(QtGui.QApplication.translate("Form", "Run", None, QtGui.QApplication.UnicodeUTF8))
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+
+class SearchIndex(object):
+    """Prefix and substring search over protein accessions and gene names.
+
+    Terms are the ';' separated entries of the protein_ids and, if the
+    file has them, gene_names columns, upper cased. They are kept sorted,
+    so the terms starting with a query are one searchsorted range.
+    Substrings of three or more characters are looked up in a trigram
+    index: the trigrams of all terms packed into sorted int64 keys, with
+    the position of their term alongside. Shorter ones scan the terms.
+    """
+    def __init__(self, protein_groups):
+        rows = np.arange(len(protein_groups.index))
+        terms = pd.concat([
+            pd.DataFrame({'term': protein_groups[column].fillna('').str.upper().str.split(';').values,
+                          'row': rows}).explode('term')
+            for column in ('protein_ids', 'gene_names') if column in protein_groups])
+        terms = terms[terms.term.str.len() > 0].drop_duplicates()
+        terms = terms.sort_values(['term', 'row'], kind='stable')
+        self.terms = terms.term.to_numpy(dtype=str)
+        self.rows = terms.row.values.astype(np.int64)
+        self._index_trigrams()
+
+    def _index_trigrams(self):
+        # Code points of the fixed width terms, 0 past the end of a term
+        width = max(self.terms.dtype.itemsize // 4, 3)
+        terms = self.terms.astype('U{}'.format(width))
+        codes = terms.view(np.uint32).reshape(len(terms), width).astype(np.int64)
+        keys = codes[:, :-2] << 42 | codes[:, 1:-1] << 21 | codes[:, 2:]
+        valid = codes[:, 2:] != 0
+        # Row major, so the positions of a key stay in order
+        positions = np.nonzero(valid)[0]
+        keys = keys[valid]
+        order = np.argsort(keys, kind='stable')
+        self.trigrams = keys[order]
+        self.trigram_terms = positions[order]
+
+    def _trigram_candidates(self, query):
+        # Terms holding every trigram of query
+        codes = [ord(char) for char in query]
+        keys = set(a << 42 | b << 21 | c for a, b, c in zip(codes, codes[1:], codes[2:]))
+        starts = np.searchsorted(self.trigrams, sorted(keys))
+        stops = np.searchsorted(self.trigrams, sorted(keys), side='right')
+        candidates = None
+        for start, stop in sorted(zip(starts, stops), key=lambda bounds: bounds[1] - bounds[0]):
+            terms = self.trigram_terms[start:stop]
+            candidates = np.unique(terms) if candidates is None else np.intersect1d(candidates, terms)
+            if not len(candidates):
+                break
+        return candidates
+
+    def search(self, query):
+        """Rows of the protein groups matching query, prefix matches first."""
+        query = query.strip().upper()
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        start, stop = np.searchsorted(self.terms, [query, query + u'\U0010ffff'])
+        rows = [self.rows[start:stop]]
+        if len(query) >= 3:
+            candidates = self._trigram_candidates(query)
+            # The trigrams may be in another order in the term
+            candidates = candidates[np.char.find(self.terms[candidates], query) >= 0]
+            rows.append(self.rows[candidates])
+        else:
+            # Too short for a trigram, scan all terms
+            rows.append(self.rows[np.char.find(self.terms, query) >= 0])
+        rows = np.concatenate(rows)
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)]
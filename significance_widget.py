@@ -4,8 +4,9 @@ from enum import Enum
 from PySide import QtCore, QtGui
 import pyqtgraph as pg
 import numpy as np
+from scipy.spatial import cKDTree
 
-from models import PandasModel
+from models import PandasModel, ProteinTableProxy
      
 
 class Color(Enum):
@@ -26,9 +27,18 @@ class FilterCheckBox(QtGui.QCheckBox):
 
 
 class SignificanceWidget(QtGui.QWidget):
+    lod_points = 10000 # Scatter points drawn without downsampling
+    lod_cell = 2 # Size in pixels of a downsampling cell
+    pick_radius = 5 # Pixels
+    colors = ('b', 'r', 'y', 'g') # Of the p value classes
+
     def __init__(self, parent, analysis):
         super(SignificanceWidget, self).__init__(parent=parent)
         self.analysis = analysis
+        self.scatter_data = {}
+        self.sample = None
+        self.scatter_key = None
+        self.labels = []
         self.set_up()
         
     def set_up(self):
@@ -40,6 +50,10 @@ class SignificanceWidget(QtGui.QWidget):
         self.scatter_widget.setLabel('left', 'Intensity')
         self.scatter_widget.setLabel('bottom', 'Log ratio')
         self.scatter_widget.setLogMode(x=False, y=True)
+        self.scatter = pg.ScatterPlotItem(pen=None, size=7, antialias=False)
+        self.scatter_widget.addItem(self.scatter)
+        self.scatter_widget.getViewBox().sigRangeChanged.connect(self.update_scatter)
+        self.scatter_widget.scene().sigMouseClicked.connect(self.scatter_clicked)
 
         # Histogram
         self.hist_widget = pg.PlotWidget(self)
@@ -55,7 +69,9 @@ class SignificanceWidget(QtGui.QWidget):
             table_view = QtGui.QTableView(self)
             self.table_views[sample] = table_view
             table_model = PandasModel(self.analysis.protein_groups, sample, parent=self)
-            table_view.setModel(table_model)
+            table_view.setModel(ProteinTableProxy(table_model, self))
+            table_view.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+            table_view.setSortingEnabled(True)
             table_view.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
             table_view.verticalHeader().setVisible(False)
             self.tab_widget.addTab(table_view, sample)
@@ -97,47 +113,105 @@ class SignificanceWidget(QtGui.QWidget):
             for b in self.filter_boxes: b.setChecked(True)
             max_p = None
        
-        for sample, table_view in self.table_views.items():
-            model = PandasModel(self.analysis.protein_groups, sample, max_p, self)
-            table_view.setModel(model)
+        for table_view in self.table_views.values():
+            table_view.model().set_max_p(max_p)
 
     def on_tab_change(self, tab_index):
         sample = self.analysis.samples[tab_index]
         self.plot_data(sample)
         
-    def plot_data(self, sample):
-        colors = ('b', 'r', 'y', 'g')
-        pgs = self.analysis.protein_groups
-        p_column = pgs['p_{}'.format(sample)]
-        data = (pgs[p_column > 0.05], pgs[p_column.between(0.01, 0.05)],
-                pgs[p_column.between(0.001, 0.01)], pgs[p_column < 0.001])
+    def get_scatter_data(self, sample):
+        # Coordinates, brushes and a KD-tree per sample, sorted on p value
+        # so that downsampling keeps the most significant point of a cell.
+        if sample not in self.scatter_data:
+            pgs = self.analysis.protein_groups
+            p = pgs['p_{}'.format(sample)].values
+            with np.errstate(divide='ignore'):
+                y = np.log10(pgs['intensity_{}'.format(sample)].values) # The axis is in log mode
+            x = pgs['log_ratio_{}'.format(sample)].values
+            order = np.argsort(p, kind='stable')
+            order = order[np.isfinite(x[order]) & np.isfinite(y[order])]
+            x, y, p = x[order], y[order], p[order]
+            colors = self.analysis.p_classes(p)
+            brushes = np.array([pg.mkBrush(color) for color in self.colors], dtype=object)
+            # np.ptp raises on a sample without finite points
+            scale = (np.ptp(x) or 1., np.ptp(y) or 1.) if len(x) else (1., 1.)
+            self.scatter_data[sample] = {
+                'x': x, 'y': y, 'brushes': brushes[colors], 'scale': scale,
+                'tree': cKDTree(np.column_stack([x / scale[0], y / scale[1]]))}
+        return self.scatter_data[sample]
 
-        # Scatterplot
-        self.scatter_widget.clear()
-        for color, points in zip(colors, data):
-            plot = self.scatter_widget.plot(
-                x=points['log_ratio_{}'.format(sample)],
-                y=points['intensity_{}'.format(sample)],
-                pen=None, symbolPen=None, symbolSize=7,
-                symbolBrush=color, antialias=False)
-            plot.sigPointsClicked.connect(self.select_protein)
+    def plot_data(self, sample):
+        self.sample = sample
+        self.scatter_key = None
+        data = self.get_scatter_data(sample)
+        for label in self.labels:
+            self.scatter_widget.removeItem(label)
+        self.labels = []
+        if len(data['x']):
+            self.scatter_widget.setRange(xRange=(data['x'].min(), data['x'].max()),
+                                         yRange=(data['y'].min(), data['y'].max()))
+        self.update_scatter()
         
-        # Histogram
+        # Histogram, the classes stacked from p > 0.05 at the bottom up
+        edges, counts = self.analysis.sample_histograms()
+        stacked = counts[self.analysis.samples.index(sample)].cumsum(axis=0)
         self.hist_widget.clear()
-        bins = np.linspace(-10, 10, 100)
-        data = pgs['log_ratio_{}'.format(sample)]
-        y, x = np.histogram(data, bins=bins)
-        self.hist_widget.plot(x, y, stepMode=True, fillLevel=0, 
-                brush=(0,0,255,150))
-
-    def select_protein(self, plot, points):
-        point = points[0]
+        for level, color in reversed(list(zip(stacked, self.colors))):
+            self.hist_widget.plot(edges, level, stepMode=True, fillLevel=0,
+                    pen=color, brush=color)
+
+    def update_scatter(self):
+        if self.sample is None:
+            return
+        data = self.get_scatter_data(self.sample)
+        x, y, brushes = data['x'], data['y'], data['brushes']
+        pixel_width, pixel_height = self.scatter_widget.getViewBox().viewPixelSize()
+        cell = (pixel_width * self.lod_cell, pixel_height * self.lod_cell)
+        downsample = len(x) > self.lod_points and min(cell) > 0
+        # Panning keeps the pixel size, only zooming changes the points
+        key = (self.sample, np.round(np.log(cell), 2).tolist() if downsample else None)
+        if key == self.scatter_key:
+            return
+        self.scatter_key = key
+        if downsample:
+            # One point per cell of a few pixels
+            cell_x = np.floor((x - x[0]) / cell[0]).astype(np.int64)
+            cell_y = np.floor((y - y[0]) / cell[1]).astype(np.int64)
+            cell_x -= cell_x.min()
+            cell_y -= cell_y.min()
+            _, keep = np.unique(cell_x * (cell_y.max() + 1) + cell_y, return_index=True)
+            x, y, brushes = x[keep], y[keep], brushes[keep]
+        self.scatter.setData(x=x, y=y, brush=brushes)
+
+    def scatter_clicked(self, event):
+        view_box = self.scatter_widget.getViewBox()
+        if self.sample is None or not view_box.sceneBoundingRect().contains(event.scenePos()):
+            return
+        data = self.get_scatter_data(self.sample)
+        pos = view_box.mapSceneToView(event.scenePos())
+        pixel_width, pixel_height = view_box.viewPixelSize()
+        scale_x, scale_y = data['scale']
+        radius = self.pick_radius * max(pixel_width / scale_x, pixel_height / scale_y)
+        candidates = data['tree'].query_ball_point([pos.x() / scale_x, pos.y() / scale_y], radius)
+        if not candidates:
+            return
+        # Nearest candidate in pixels
+        candidates = np.asarray(candidates)
+        distance = np.hypot((data['x'][candidates] - pos.x()) / pixel_width,
+                            (data['y'][candidates] - pos.y()) / pixel_height)
+        i = candidates[np.argmin(distance)]
+        if distance.min() <= self.pick_radius:
+            self.select_protein(data['x'][i], data['y'][i])
+
+    def select_protein(self, x, y):
         text_item = pg.TextItem('sel', anchor=(1, 1), color=(0, 0, 0))
-        text_item.setPos(point.pos())
+        text_item.setPos(x, y)
         self.scatter_widget.addItem(text_item)
+        self.labels.append(text_item)
 
     def select_pg(self, pg_id):
         table = self.tab_widget.currentWidget()
-        table_data = table.model()._data
-        i = table_data['id'].tolist().index(pg_id)
-        table.selectRow(i)
+        i = table.model().find_row(pg_id)
+        if i >= 0:
+            table.selectRow(i)
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from associations import AssociationStore
+
+
+GAF = [
+    ['UniProtKB', 'P00001', 'A', '', 'GO:0000001', 'PMID:1', 'IDA', '', 'F'],
+    ['UniProtKB', '', 'B', '', 'GO:0000002', 'PMID:1', 'IDA', '', 'P'],
+    ['UniProtKB', 'P00002', 'C', '', '', 'PMID:1', 'IDA', '', 'C'],
+    ['UniProtKB', 'P00002', 'C', '', 'GO:0000003', 'PMID:1', 'IDA', '', 'C'],
+    ['UniProtKB', 'P00001', 'A', '', 'GO:0000001', 'PMID:2', 'IDA', '', 'F'],
+]
+
+
+@pytest.fixture
+def gaf_file(tmp_path):
+    # Blank accession (column 2) and GO id (column 5) on the middle rows
+    path = tmp_path / 'associations.gaf'
+    lines = ['!gaf-version: 2.1'] + ['\t'.join(row + [''] * 8) for row in GAF]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_blank_fields_are_dropped(gaf_file, tmp_path, cached):
+    cache = str(tmp_path / 'cache')
+    if cached:
+        AssociationStore(gaf_file, cache=cache)
+    store = AssociationStore(gaf_file, cache=cache)
+    assert len(store) == 2
+    protein_map = pd.Series([10, 20], index=['P00001', 'P00002'])
+    associations = store.associations(protein_map)
+    assert associations.values.tolist() == [[10, 'GO:0000001', 'F'], [20, 'GO:0000003', 'C']]
@@ -0,0 +1,46 @@
+import pytest
+
+from obo_parser import OBOReader
+
+
+OBO = """format-version: 1.2
+data-version: releases/2020-01-01
+
+[Term]
+id: GO:0000001
+name: first
+namespace: biological_process
+ 
+[Term]
+id: GO:0000002
+name: second
+namespace: biological_process
+is_a: GO:0000001 ! first
+\t
+
+[Typedef]
+id: part_of
+name: part of
+
+[Term]
+id: GO:0000003
+name: third
+namespace: biological_process
+"""
+
+
+@pytest.mark.parametrize('fast', [False, True])
+def test_whitespace_line_ends_stanza(tmp_path, fast):
+    obo_file = tmp_path / 'go.obo'
+    obo_file.write_text(OBO)
+    recs = list(OBOReader(str(obo_file), fast=fast))
+    assert [rec.id for rec in recs] == ['GO:0000001', 'GO:0000002', 'GO:0000003']
+    assert recs[1]._parents == ['GO:0000001']
+
+
+@pytest.mark.parametrize('fast', [False, True])
+def test_unexpected_line_number(tmp_path, fast):
+    obo_file = tmp_path / 'go.obo'
+    obo_file.write_text(OBO + 'no tag\n')
+    with pytest.raises(Exception, match=r'\(23\): UNEXPECTED LINE CONTENT'):
+        list(OBOReader(str(obo_file), fast=fast))